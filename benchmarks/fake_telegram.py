@@ -0,0 +1,335 @@
+"""Simulated Telegram client for benchmarks
+
+Stands in for pyrogram's Client, media Session and Auth so the real
+transfer code (ParallelDownloader, PartUploader, TurboDownloader,
+TurboUploader, TurboStreamer) runs unchanged against an in-process
+network with configurable bandwidth, per-part latency, data center
+switches and FLOOD_WAIT responses. The single-stream calls (download,
+send_document, stream_media) swallow errors the way pyrogram does: they
+log, then return None or end the stream early. Nothing leaves the machine; time is
+spent in asyncio.sleep, so results depend on the bot's scheduling and
+concurrency rather than on real links.
+"""
+import os
+import random
+import asyncio
+import logging
+from itertools import count
+from types import SimpleNamespace
+from pyrogram import raw
+from pyrogram.errors import FloodWait
+from pyrogram.file_id import FileId, FileType, FileUniqueId, FileUniqueType
+
+HOME_DC = 2
+OTHER_DCS = (1, 3, 4, 5)
+DOWNLOAD_PART_SIZE = 1024 * 1024
+STATUS_ID_BASE = 10 ** 9  # Status message ids, apart from file message ids
+
+log = logging.getLogger(__name__)
+
+
+class Link:
+    """One direction of a shared pipe; transfers queue for its bandwidth"""
+
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth  # bytes per second
+        self.free_at = 0.0
+
+    async def transfer(self, size, latency):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self.free_at)
+        self.free_at = start + size / self.bandwidth
+        await asyncio.sleep(self.free_at - now + latency)
+
+
+class FakeNetwork:
+    """Shared link model plus counters of everything the bot asked for"""
+
+    def __init__(self, bandwidth=400 * 1024 * 1024, latency=0.03, jitter=0.01, dc_switch_rate=0.2,
+                 dc_switch_latency=0.3, connect_latency=0.05, flood_rate=0.01, flood_wait=1,
+                 edit_latency=0.05, seed=1):
+        self.down = Link(bandwidth)
+        self.up = Link(bandwidth)
+        self.latency = latency
+        self.jitter = jitter
+        self.dc_switch_rate = dc_switch_rate
+        self.dc_switch_latency = dc_switch_latency
+        self.connect_latency = connect_latency
+        self.flood_rate = flood_rate
+        self.flood_wait = flood_wait
+        self.edit_latency = edit_latency
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.counters = dict.fromkeys(('rpcs', 'flood_waits', 'dc_switches', 'connections', 'edits'), 0)
+
+    def draw(self, key):
+        """Uniform number fixed by the request identity, so runs see the same
+        FLOOD_WAITs and jitter whatever order the bot happens to send requests in"""
+        if key is None:
+            return self.random.random()
+        return random.Random(f"{self.seed}:{key}").random()
+
+    def pick_dc(self, key):
+        if self.draw(f"dc:{key}") < self.dc_switch_rate:
+            return OTHER_DCS[int(self.draw(f"other-dc:{key}") * len(OTHER_DCS))]
+        return HOME_DC
+
+    async def rpc(self, link=None, size=0, sleep_threshold=10, key=None):
+        """One request/response; FLOOD_WAIT below the threshold is slept through like pyrogram does"""
+        for attempt in count():
+            self.counters['rpcs'] += 1
+            attempt_key = f"{key}:{attempt}" if key is not None else None
+            if self.draw(attempt_key) < self.flood_rate:
+                self.counters['flood_waits'] += 1
+                if self.flood_wait > sleep_threshold:
+                    raise FloodWait(value=self.flood_wait)
+                await asyncio.sleep(self.flood_wait)
+                continue
+            latency = self.latency + self.jitter * self.draw(f"jitter:{attempt_key}" if key is not None else None)
+            if link:
+                await link.transfer(size, latency)
+            else:
+                await asyncio.sleep(latency)
+            return
+
+    def reset(self):
+        for name in self.counters:
+            self.counters[name] = 0
+
+
+def file_part(size):
+    """Payload bytes; content is irrelevant to the bot"""
+    return bytes(size)
+
+
+class FakeSession:
+    """Drop-in for pyrogram.session.Session on a media data center"""
+
+    def __init__(self, client, dc_id, auth_key, test_mode, is_media=False, is_cdn=False):
+        self.client = client
+        self.network = client.network
+        self.dc_id = dc_id
+        self.files = client.files
+
+    async def start(self):
+        self.network.counters['connections'] += 1
+        await asyncio.sleep(self.network.connect_latency)
+
+    async def stop(self):
+        pass
+
+    async def invoke(self, query, retries=None, timeout=None, sleep_threshold=10):
+        network = self.network
+        if isinstance(query, raw.functions.upload.GetFile):
+            file_size, file_name = self.files[query.location.id]
+            size = max(0, min(query.limit, file_size - query.offset))
+            await network.rpc(network.down, size, sleep_threshold, f"get:{file_name}:{query.offset}")
+            return raw.types.upload.File(type=raw.types.storage.FilePartial(), mtime=0, bytes=file_part(size))
+        if isinstance(query, (raw.functions.upload.SaveFilePart, raw.functions.upload.SaveBigFilePart)):
+            await network.rpc(network.up, len(query.bytes), sleep_threshold,
+                              f"save:{query.file_id}:{query.file_part}")
+            return True
+        await network.rpc(sleep_threshold=sleep_threshold)
+        return True
+
+
+class FakeAuth:
+    """Drop-in for pyrogram.session.Auth; creating a key on another DC is the switch cost"""
+
+    def __init__(self, client, dc_id, test_mode):
+        self.network = client.network
+
+    async def create(self):
+        self.network.counters['dc_switches'] += 1
+        await asyncio.sleep(self.network.dc_switch_latency)
+        return os.urandom(256)
+
+
+class FakeStorage:
+    async def dc_id(self):
+        return HOME_DC
+
+    async def test_mode(self):
+        return False
+
+    async def auth_key(self):
+        return b"\0" * 256
+
+
+class FakeParser:
+    async def parse(self, text, mode=None):
+        return {'message': text, 'entities': None}
+
+
+class FakeStatusMessage:
+    """Status message whose edits cost a round trip and may hit FLOOD_WAIT"""
+
+    def __init__(self, network, chat_id, message_id):
+        self.network = network
+        self.chat = SimpleNamespace(id=chat_id)
+        self.id = message_id
+        self.edits = 0
+        self.text = ""
+
+    async def edit_text(self, text, **kwargs):
+        network = self.network
+        self.edits += 1
+        network.counters['edits'] += 1
+        if network.draw(f"edit:{self.id}:{self.edits}") < network.flood_rate:
+            network.counters['flood_waits'] += 1
+            raise FloodWait(value=network.flood_wait)
+        await asyncio.sleep(network.edit_latency)
+        self.text = text
+        return self
+
+
+class FakeMessage:
+    """User message carrying a document that lives on a (possibly foreign) data center"""
+
+    def __init__(self, client, chat_id, message_id, user_id, file_name, file_size, dc_id, media_id):
+        self._client = client
+        self.id = message_id
+        self.empty = False
+        self.chat = SimpleNamespace(id=chat_id)
+        self.from_user = SimpleNamespace(id=user_id, username=f"user{user_id}")
+        self.video = None
+        self.audio = None
+        self.document = SimpleNamespace(
+            file_id=FileId(
+                file_type=FileType.DOCUMENT, dc_id=dc_id, media_id=media_id,
+                access_hash=media_id, file_reference=b"\0"
+            ).encode(),
+            file_unique_id=FileUniqueId(file_unique_type=FileUniqueType.DOCUMENT, media_id=media_id).encode(),
+            file_name=file_name,
+            file_size=file_size,
+            mime_type="application/octet-stream",
+        )
+
+    async def download(self, file_name, progress=None, progress_args=()):
+        """Single-stream download, as pyrogram does for small files"""
+        network = self._client.network
+        size = self.document.file_size
+        os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+        try:
+            with open(file_name, 'wb') as f:
+                done = 0
+                while done < size:
+                    part = min(DOWNLOAD_PART_SIZE, size - done)
+                    await network.rpc(network.down, part, key=f"get:{self.document.file_name}:{done}")
+                    f.write(file_part(part))
+                    done += part
+                    if progress:
+                        await progress(done, size, *progress_args)
+        except Exception as e:
+            # pyrogram's get_file logs, and handle_download removes the file and returns None
+            log.debug(f"Download failed: {e}")
+            os.remove(file_name)
+            return None
+        return file_name
+
+
+class FakeClient:
+    """The subset of pyrogram.Client the transfer and status code uses"""
+
+    def __init__(self, network: FakeNetwork):
+        self.network = network
+        self.storage = FakeStorage()
+        self.parser = FakeParser()
+        self.sleep_threshold = 10
+        self.files = {}  # media_id -> (file size, file name), read by sessions serving GetFile
+        self.ids = count(1)
+        self.reset()
+        self.sent = 0
+
+    def reset(self):
+        """Restart the counters that key simulated faults, so a repeated scenario
+        sees the same FLOOD_WAITs; media ids keep counting so files stay distinct"""
+        self.random_ids = count(1)
+        self.status_ids = count(STATUS_ID_BASE)
+
+    def rnd_id(self):
+        return next(self.random_ids)
+
+    def guess_mime_type(self, file_name):
+        return "application/octet-stream"
+
+    def make_message(self, user_id, file_name, file_size):
+        """A user's file message; media on another DC with the network's switch rate
+
+        File names key the simulated FLOOD_WAITs and DC placement, so they
+        should be unique per benchmark job.
+        """
+        media_id = next(self.ids)
+        self.files[media_id] = (file_size, file_name)
+        return FakeMessage(self, user_id, media_id, user_id, file_name, file_size,
+                           self.network.pick_dc(file_name), media_id)
+
+    def make_status_message(self, chat_id):
+        return FakeStatusMessage(self.network, chat_id, next(self.status_ids))
+
+    async def invoke(self, query, sleep_threshold=None):
+        await self.network.rpc()
+        if isinstance(query, raw.functions.auth.ExportAuthorization):
+            return SimpleNamespace(id=1, bytes=b"\0")
+        if isinstance(query, raw.functions.messages.SendMedia):
+            self.sent += 1
+            return SimpleNamespace(updates=[], users=[], chats=[])
+        return True
+
+    async def resolve_peer(self, peer_id):
+        return raw.types.InputPeerUser(user_id=abs(int(peer_id)), access_hash=0)
+
+    async def save_file(self, path, **kwargs):
+        data = path.getvalue() if hasattr(path, 'getvalue') else b""
+        await self.network.rpc(self.network.up, len(data))
+        return raw.types.InputFile(id=self.rnd_id(), parts=1, name="thumb.jpg", md5_checksum="")
+
+    async def send_document(self, chat_id, document, file_name=None, caption="", thumb=None, progress=None,
+                            **kwargs):
+        """Single-stream upload in 512KB parts, as pyrogram does"""
+        network = self.network
+        size = os.path.getsize(document)
+        done = 0
+        try:
+            while done < size:
+                part = min(512 * 1024, size - done)
+                await network.rpc(network.up, part, key=f"save:{document}:{done}")
+                done += part
+                if progress:
+                    await progress(done, size)
+        except Exception as e:
+            # pyrogram's save_file logs the error and the send returns None
+            log.debug(f"Upload failed: {e}")
+            return None
+        await network.rpc()
+        self.sent += 1
+        return SimpleNamespace(id=next(self.ids), chat=SimpleNamespace(id=chat_id), document=None)
+
+    async def stream_media(self, message, limit=0, offset=0):
+        network = self.network
+        size = message.document.file_size
+        done = offset * DOWNLOAD_PART_SIZE
+        while done < size:
+            part = min(DOWNLOAD_PART_SIZE, size - done)
+            try:
+                await network.rpc(network.down, part, key=f"get:{message.document.file_name}:{done}")
+            except Exception as e:
+                # pyrogram's get_file logs and ends the stream early
+                log.debug(f"Stream failed: {e}")
+                return
+            done += part
+            yield file_part(part)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self.network.rpc()
+
+    async def forward_messages(self, chat_id, from_chat_id, message_ids, **kwargs):
+        await self.network.rpc()
+
+
+def install():
+    """Route MediaSessionPool through the fake session and auth"""
+    import media_sessions
+    media_sessions.Session = FakeSession
+    media_sessions.Auth = FakeAuth
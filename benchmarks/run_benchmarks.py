@@ -0,0 +1,267 @@
+"""End-to-end transfer benchmarks against a simulated Telegram
+
+Usage (from the repository root):
+
+    python benchmarks/run_benchmarks.py                  # run and compare with the baseline
+    python benchmarks/run_benchmarks.py --save-baseline  # record a new baseline
+    python benchmarks/run_benchmarks.py --users 1,10 --file-size-mb 4
+    python benchmarks/run_benchmarks.py --repeats 5           # steadier medians, slower
+
+Each scenario starts N simulated users at once; every user sends its files
+one after another through JobScheduler and TurboFileProcessor.process_file,
+exactly as the bot does after a rename reply. Two transfer scenarios time
+TurboDownloader and TurboUploader alone on one large file. Every scenario
+runs --repeats times and reports the median of each metric, since a single
+run of a small scenario moves by more than the thresholds. The process
+exits with status 1 when a median regresses past its threshold.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Config requires these; the fake client never uses them for anything real
+os.environ.setdefault("API_ID", "1")
+os.environ.setdefault("LOG_CHANNEL", "-1001")
+
+from fake_telegram import FakeNetwork, FakeClient, install  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MB = 1024 * 1024
+
+# Allowed relative change against the baseline before a run counts as a regression
+REGRESSION_THRESHOLDS = {
+    'jobs_per_second': ('higher', 0.10),
+    'mb_per_second': ('higher', 0.10),
+    'p50_latency': ('lower', 0.15),
+    'p99_latency': ('lower', 0.20),
+    'edits_per_job': ('lower', 0.25),
+}
+
+
+def median_row(rows):
+    """Per-metric median of repeated runs of one scenario"""
+    return {
+        key: round(statistics.median(row[key] for row in rows), 3)
+        for key in rows[0]
+    }
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+async def run_users(processor, client, network, users, jobs_per_user, file_size):
+    """N users sending their files concurrently; returns scenario metrics"""
+    from job_scheduler import job_scheduler
+    from progress_ticker import TransferProgress
+    from chunk_tuner import chunk_tuner
+
+    latencies = []
+    status_messages = []
+    failures = 0
+
+    async def user(user_id):
+        nonlocal failures
+        for index in range(jobs_per_user):
+            message = client.make_message(user_id, f"file_{user_id}_{index}.bin", file_size)
+            status = client.make_status_message(user_id)
+            status_messages.append(status)
+            progress = TransferProgress(status, message.document.file_name)
+
+            started_at = time.perf_counter()
+            result = await job_scheduler.run(
+                user_id, file_size,
+                lambda: processor.process_file(client, message, f"renamed_{index}", status, user_id, progress),
+                progress
+            )
+            latencies.append(time.perf_counter() - started_at)
+            if not result['success']:
+                failures += 1
+                logging.warning(f"Job failed: {result.get('error')}")
+
+    network.reset()
+    client.reset()
+    # Each scenario starts cold rather than from what the previous one taught the tuner
+    chunk_tuner.links.clear()
+    started_at = time.perf_counter()
+    await asyncio.gather(*(user(user_id) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - started_at
+    jobs = users * jobs_per_user
+
+    return {
+        'jobs': jobs,
+        'failures': failures,
+        'seconds': round(elapsed, 3),
+        'jobs_per_second': round(jobs / elapsed, 3),
+        'mb_per_second': round(jobs * file_size / MB / elapsed, 2),
+        'p50_latency': round(percentile(latencies, 0.50), 3),
+        'p99_latency': round(percentile(latencies, 0.99), 3),
+        'edits_per_job': round(sum(s.edits for s in status_messages) / jobs, 2),
+        **{name: value for name, value in network.counters.items() if name != 'edits'},
+    }
+
+
+async def run_transfers(processor, client, network, file_size):
+    """TurboDownloader and TurboUploader alone on one file"""
+    from progress_ticker import TransferProgress
+    from staging import staging_manager
+    from chunk_tuner import chunk_tuner
+
+    results = {}
+    network.reset()
+    client.reset()
+    chunk_tuner.links.clear()
+    message = client.make_message(1, "transfer.bin", file_size)
+    area = await staging_manager.reserve(file_size)
+    started_at = time.perf_counter()
+    download = await processor.downloader.download_file(message, TransferProgress(), area)
+    elapsed = time.perf_counter() - started_at
+    if not download['success']:
+        raise RuntimeError(f"Download failed: {download['error']}")
+    results['download'] = {'seconds': round(elapsed, 3), 'mb_per_second': round(file_size / MB / elapsed, 2)}
+
+    started_at = time.perf_counter()
+    upload = await processor.uploader.upload_file(
+        client, 1, download['file_path'], TransferProgress(), "", file_name="transfer.bin"
+    )
+    elapsed = time.perf_counter() - started_at
+    area.release()
+    if not upload['success']:
+        raise RuntimeError(f"Upload failed: {upload['error']}")
+    results['upload'] = {'seconds': round(elapsed, 3), 'mb_per_second': round(file_size / MB / elapsed, 2)}
+    return results
+
+
+async def run_all(args):
+    install()
+    from config import Config
+    from file_processor import TurboFileProcessor
+    from log_pipeline import log_pipeline
+
+    Config.STREAMING_MODE = args.streaming
+    network = FakeNetwork(
+        bandwidth=args.bandwidth_mb * MB,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        dc_switch_rate=args.dc_switch_rate,
+        flood_rate=args.flood_rate,
+        flood_wait=args.flood_wait,
+        seed=args.seed,
+    )
+    client = FakeClient(network)
+    processor = TurboFileProcessor()
+
+    runs = {}
+    for users in args.users:
+        runs[f"users_{users}"] = [
+            await run_users(processor, client, network, users, args.jobs_per_user, args.file_size_mb * MB)
+            for _ in range(args.repeats)
+        ]
+    if not args.streaming:
+        for _ in range(args.repeats):
+            for name, row in (await run_transfers(processor, client, network, args.transfer_size_mb * MB)).items():
+                runs.setdefault(name, []).append(row)
+
+    results = {name: median_row(rows) for name, rows in runs.items()}
+    for name, row in results.items():
+        print(format_row(name, row))
+
+    await log_pipeline.stop()
+    return results
+
+
+def format_row(name, row):
+    return f"{name:>10}: " + ", ".join(f"{key}={value}" for key, value in row.items())
+
+
+def compare(results, baseline):
+    """Regressions against the baseline, as readable lines"""
+    regressions = []
+    for scenario, row in results.items():
+        reference = baseline.get(scenario)
+        if not reference:
+            continue
+        for metric, (better, tolerance) in REGRESSION_THRESHOLDS.items():
+            if metric not in row or not reference.get(metric):
+                continue
+            change = (row[metric] - reference[metric]) / reference[metric]
+            if (better == 'higher' and change < -tolerance) or (better == 'lower' and change > tolerance):
+                regressions.append(
+                    f"{scenario}.{metric}: {reference[metric]} -> {row[metric]} "
+                    f"({change:+.0%}, allowed {'-' if better == 'higher' else '+'}{tolerance:.0%})"
+                )
+    return regressions
+
+
+def settings_of(args):
+    """Arguments that change what is measured; a baseline only applies to the same settings"""
+    return {key: value for key, value in sorted(vars(args).items()) if key not in ('save_baseline', 'baseline', 'repeats')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transfer benchmarks against a simulated Telegram")
+    parser.add_argument('--users', default="1,10,100", type=lambda value: [int(n) for n in value.split(',')])
+    parser.add_argument('--jobs-per-user', type=int, default=2)
+    parser.add_argument('--file-size-mb', type=int, default=24)
+    parser.add_argument('--transfer-size-mb', type=int, default=128)
+    parser.add_argument('--bandwidth-mb', type=float, default=400, help="Simulated link, MB/s each way")
+    parser.add_argument('--latency-ms', type=float, default=30, help="Per-part round trip")
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--dc-switch-rate', type=float, default=0.2, help="Share of files on another DC")
+    parser.add_argument('--flood-rate', type=float, default=0.01, help="Share of requests answered FLOOD_WAIT")
+    parser.add_argument('--flood-wait', type=int, default=1, help="FLOOD_WAIT seconds")
+    parser.add_argument('--streaming', action='store_true', help="Benchmark STREAMING_MODE")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=3, help="Runs per scenario; medians are compared")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    settings = settings_of(args)
+
+    # Staging files, caches and thumbnails go to a scratch directory
+    with tempfile.TemporaryDirectory(prefix="renamer-bench-") as workdir:
+        os.chdir(workdir)
+        results = asyncio.run(run_all(args))
+        os.chdir(ROOT)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        print("No baseline to compare with; run with --save-baseline first")
+        return 0
+    if baseline.get('settings') != settings:
+        print("Baseline was recorded with different settings; not comparing")
+        return 0
+
+    regressions = compare(results, baseline['results'])
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("No regressions against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
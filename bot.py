@@ -4,6 +4,12 @@ import logging
 import sys
 import asyncio
 from config import Config
+from state_store import state_store
+from staging import staging_manager
+from upload_index import upload_index
+from file_cache import file_cache
+from log_pipeline import log_pipeline
+from web_server import web_server
 
 # Import handlers
 from bot_core import setup_bot_handlers
@@ -54,6 +60,15 @@ class TurboBot:
     async def start_bot(self):
         """Start the turbo bot"""
         try:
+            await state_store.start()
+            # Reattach or delete partial downloads left by the last run
+            staging_manager.load()
+            try:
+                await web_server.start()
+            except Exception as e:
+                # Health and metrics endpoints are optional; the bot works without them
+                logger.error(f"❌ Web server failed to start: {e}")
+                await web_server.stop()
             await self.client.start()
             bot_info = await self.client.get_me()
             logger.info(f"🚀 Turbo Bot started: @{bot_info.username}")
@@ -76,6 +91,8 @@ class TurboBot:
             return
 
         if not await self.start_bot():
+            # Stop whatever started before the failure
+            await self.shutdown()
             return
 
         try:
@@ -90,8 +107,13 @@ class TurboBot:
 
     async def shutdown(self):
         """Graceful shutdown"""
-        if self.client:
+        if self.client and self.client.is_connected:
+            await log_pipeline.stop()
             await self.client.stop()
+        await web_server.stop()
+        await upload_index.stop()
+        await file_cache.stop()
+        await state_store.stop()
         logger.info("🔴 Turbo Bot stopped")
 
 async def main():
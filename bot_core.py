@@ -1,21 +1,30 @@
 import os
+import re
 import time
+import string
 import asyncio
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup
 from config import Config
 from file_processor import TurboFileProcessor
-from datetime import datetime, timedelta
+from job_scheduler import job_scheduler
+from job_manager import Job, job_manager
+from part_uploader import target_file_name
+from progress_ticker import TransferProgress, BatchProgress, progress_ticker, format_time
+from user_thumbnails import user_thumbnails
+from state_store import state_store
+from rate_limiter import rate_limiter
+from user_session import BatchRecord
+from job_api import job_api
 import logging
 
 logger = logging.getLogger(__name__)
 
-# User session management
-user_sessions = {}
 file_processor = TurboFileProcessor()
 
 def setup_bot_handlers(client: Client):
     """Setup all bot handlers with thumbnail support"""
+    job_api.attach(client, file_processor)
     
     @client.on_message(filters.command("start"))
     async def turbo_start(_, message: Message):
@@ -30,37 +39,65 @@ def setup_bot_handlers(client: Client):
             "• **Custom Thumbnail Support** ✅\n"
             "• **Complete Logging** ✅\n"
             "• **4GB File Support** ✅\n\n"
-            "Send any file to get started!",
+            "Send any file to get started!\n"
+            "Use /batch to rename many files with one pattern.\n"
+            "Use /jobs to see running jobs and /cancel to stop one.",
             reply_markup=keyboard
         )
 
     @client.on_message(filters.command("thumbnail"))
     async def thumbnail_info(_, message: Message):
         """Show thumbnail information"""
-        uploader = file_processor.uploader
-        thumb_status = "✅ **Custom Thumbnail Active**" if uploader.thumbnail else "❌ **No Thumbnail**"
+        thumbnail = await file_processor.resolve_thumbnail({'user_id': message.from_user.id})
+        is_personal = thumbnail is not None and thumbnail is not file_processor.uploader.thumbnail
+        thumb_status = (
+            "✅ **Your Custom Thumbnail Active**" if is_personal
+            else "✅ **Default Thumbnail Active**" if thumbnail
+            else "❌ **No Thumbnail**"
+        )
         
-        if uploader.thumbnail and os.path.exists(uploader.thumbnail):
-            thumb_size = os.path.getsize(uploader.thumbnail)
+        if thumbnail:
             thumb_info = (
                 f"{thumb_status}\n\n"
-                f"**File:** `{os.path.basename(uploader.thumbnail)}`\n"
-                f"**Size:** {format_bytes(thumb_size)}\n"
+                f"**Source:** `{thumbnail.source}`\n"
+                f"**Size:** {format_bytes(thumbnail.size)}\n"
                 f"**Dimensions:** {Config.THUMBNAIL_SIZE[0]}x{Config.THUMBNAIL_SIZE[1]}\n\n"
-                f"To change thumbnail, replace `thumbnail.jpg` file."
+                f"Send a photo to set your own thumbnail, /delthumb to remove it."
             )
         else:
             thumb_info = (
                 f"{thumb_status}\n\n"
-                f"To add custom thumbnail:\n"
-                f"1. Create a `thumbnail.jpg` file\n"
-                f"2. Place it in bot directory\n"
-                f"3. Restart the bot\n\n"
+                f"Send a photo to set your own thumbnail.\n\n"
                 f"Recommended size: 320x320 pixels"
             )
         
         await message.reply_text(thumb_info)
 
+    @client.on_message(filters.photo & filters.private)
+    async def set_thumbnail(_, message: Message):
+        """Use the sent photo as the user's thumbnail"""
+        try:
+            photo = await message.download(in_memory=True)
+            await user_thumbnails.set(message.from_user.id, photo.getvalue())
+        except Exception as e:
+            logger.warning(f"Thumbnail update failed: {e}")
+            await message.reply_text("❌ **Could not use this photo as a thumbnail**")
+            return
+
+        await message.reply_text(
+            "🖼️ **Thumbnail Saved!**\n\n"
+            "It will be applied to all your renamed files.\n"
+            "Use /delthumb to go back to the default."
+        )
+
+    @client.on_message(filters.command("delthumb"))
+    async def delete_thumbnail(_, message: Message):
+        """Remove the user's thumbnail"""
+        if user_thumbnails.delete(message.from_user.id):
+            await message.reply_text("🗑️ **Thumbnail removed**, using the default again.")
+        else:
+            await message.reply_text("ℹ️ You don't have a custom thumbnail.")
+
     @client.on_message(filters.command("logchannel"))
     async def log_channel_info(_, message: Message):
         """Show log channel information"""
@@ -92,20 +129,64 @@ def setup_bot_handlers(client: Client):
         
         await message.reply_text(log_info)
 
+    @client.on_message(filters.command("batch"))
+    async def start_batch(_, message: Message):
+        """Start collecting files for a batch rename"""
+        session = await state_store.load_session(message.from_user.id)
+        session.clear_pending()
+        session.batch = BatchRecord(message.chat.id, explicit=True)
+        state_store.save_session(message.from_user.id)
+
+        await message.reply_text(
+            "📦 **Batch Mode**\n\n"
+            f"Send up to {Config.MAX_BATCH_FILES} files, then send a naming pattern:\n"
+            "`Show S01E{n:02d}` → `Show S01E01`, `Show S01E02`, ...\n\n"
+            "`{n}` is the file number, `{name}` the original name."
+        )
+
+    @client.on_message(filters.command("jobs"))
+    async def list_jobs(_, message: Message):
+        """Show the user's running jobs"""
+        jobs = job_manager.user_jobs(message.from_user.id)
+        if not jobs:
+            await message.reply_text("📭 **No active jobs**")
+            return
+
+        lines = ["⚙️ **Your Active Jobs**\n"]
+        for job in jobs:
+            lines.append(
+                f"`{job.id}` • {job.phase.title()} • `{job.file_name}`\n"
+                f"    {format_bytes(job.bytes_done)} / {format_bytes(job.bytes_total)} • "
+                f"{format_time(time.time() - job.started_at)}"
+            )
+        lines.append("\nUse `/cancel <id>` or `/cancel all` to stop jobs.")
+        await message.reply_text("\n".join(lines))
+
+    @client.on_message(filters.command("cancel"))
+    async def cancel_job(_, message: Message):
+        """Abort one or all of the user's jobs"""
+        user_id = message.from_user.id
+        if len(message.command) < 2:
+            await message.reply_text("Usage: `/cancel <job id>` or `/cancel all`")
+            return
+
+        target = message.command[1]
+        if target == "all":
+            job_ids = [job.id for job in job_manager.user_jobs(user_id)]
+        else:
+            job_ids = [target]
+
+        cancelled = [job_id for job_id in job_ids if job_manager.cancel(job_id, user_id)]
+        if cancelled:
+            await message.reply_text(f"🛑 **Cancelled:** {', '.join(f'`{j}`' for j in cancelled)}")
+        else:
+            await message.reply_text("❌ **No such job**")
+
     @client.on_message(filters.document | filters.video | filters.audio)
     async def handle_file(client, message: Message):
         """Handle incoming files with thumbnail support"""
         user_id = message.from_user.id
         
-        # Rate limiting
-        if not await check_rate_limit(user_id):
-            await message.reply_text(
-                "⏳ **Rate Limit Reached**\n\n"
-                f"Limit: {Config.USER_RATE_LIMIT} files/hour\n"
-                "Please wait before sending more files."
-            )
-            return
-
         # Check file size
         file_size = get_file_size(message)
         if file_size > Config.MAX_FILE_SIZE:
@@ -116,13 +197,36 @@ def setup_bot_handlers(client: Client):
             )
             return
 
-        # Store file info
-        user_sessions[user_id] = {
-            'file_message': message,
-            'file_size': file_size,
-            'received_time': datetime.now(),
-            'waiting_for_name': True
-        }
+        # Rate limiting (file count and bytes)
+        allowed, reason, retry_after = await check_rate_limit(user_id, file_size)
+        if not allowed:
+            await message.reply_text(rate_limit_text(reason, retry_after))
+            return
+
+        # Batches and albums collect files instead of asking for a name each time
+        session = await state_store.load_session(user_id)
+        batch = session.batch
+        if batch and not batch.explicit and batch.album_id != message.media_group_id:
+            batch = session.batch = None
+        if batch is None and message.media_group_id:
+            batch = session.batch = BatchRecord(message.chat.id, explicit=False, album_id=message.media_group_id)
+            session.clear_pending()
+            await message.reply_text(
+                "📦 **Album Received!**\n\n"
+                "Send a naming pattern for all its files:\n"
+                "Example: `Show S01E{n:02d}`"
+            )
+        if batch is not None:
+            if len(batch.message_ids) >= Config.MAX_BATCH_FILES:
+                await message.reply_text(f"❌ **Batch Full** (max {Config.MAX_BATCH_FILES} files)")
+                return
+            batch.message_ids.append(message.id)
+            state_store.save_session(user_id)
+            return
+
+        # Store file info (ids only; the message is re-fetched when the name arrives)
+        session.set_pending(message, file_size)
+        state_store.save_session(user_id)
 
         # Show file info with thumbnail status
         uploader = file_processor.uploader
@@ -140,9 +244,13 @@ def setup_bot_handlers(client: Client):
     async def handle_filename(client, message: Message):
         """Handle filename input"""
         user_id = message.from_user.id
-        session = user_sessions.get(user_id)
+        session = await state_store.load_session(user_id)
 
-        if not session or not session.get('waiting_for_name'):
+        if session.batch is not None:
+            await start_batch_rename(client, message, session)
+            return
+
+        if not session.waiting_for_name:
             await message.reply_text("📁 Please send a file first!")
             return
 
@@ -157,34 +265,152 @@ def setup_bot_handlers(client: Client):
             )
             return
 
-        # Process the file
-        await process_file_rename(client, message, session, new_name)
+        # The pending file now belongs to the job
+        file_ref = session.take_pending()
+        state_store.save_session(user_id)
+
+        try:
+            file_msg = await file_ref.fetch(client)
+        except Exception as e:
+            logger.warning(f"Could not re-fetch file message: {e}")
+            file_msg = None
+        if not file_msg or file_msg.empty:
+            await message.reply_text("❌ **Original file not found.** Please send the file again.")
+            return
+
+        # Repeat requests are answered instantly from the upload index
+        cached = await file_processor.send_cached(client, file_msg, new_name, message.chat.id)
+        if cached:
+            await message.reply_text("✅ **Processing Complete!**\n\n**Served instantly from cache** ⚡")
+            return
+
+        # Transfers are charged to the byte budgets before anything is downloaded
+        allowed, reason, retry_after = rate_limiter.reserve_bytes(session, get_file_size(file_msg))
+        if not allowed:
+            session.set_pending(file_msg, get_file_size(file_msg))
+            state_store.save_session(user_id)
+            await message.reply_text(rate_limit_text(reason, retry_after) + "\nSend the name again later.")
+            return
+        state_store.save_session(user_id)
 
-    async def process_file_rename(client, message, session, new_name):
-        """Process file renaming with enhanced feedback"""
         status_msg = await message.reply_text(
             f"⚡ **Processing Started**\n\n"
             f"**Thumbnail:** {'✅' if file_processor.uploader.thumbnail else '⚠️'}\n"
             f"**Logging:** {'✅' if Config.LOG_CHANNEL else '❌'}\n"
             f"**Status:** Initializing..."
         )
-        
+
+        # Run in the background so the dispatcher worker is freed immediately
+        progress = TransferProgress(status_msg, get_file_name(file_msg))
+        job = Job(message.from_user.id, message.chat.id, get_file_name(file_msg), get_file_size(file_msg), progress)
+        progress.details['Job'] = f"`{job.id}`"
+        job_manager.submit(job, process_file_rename(client, message, file_msg, new_name, status_msg, progress))
+
+    async def start_batch_rename(client, message, session):
+        """Validate the pattern and run every file of the batch as its own job"""
+        batch = session.batch
+        if not batch.message_ids:
+            await message.reply_text("📁 Please send the files for the batch first!")
+            return
+
+        try:
+            files = await batch.fetch(client)
+        except Exception as e:
+            logger.warning(f"Could not re-fetch batch files: {e}")
+            files = []
+        if not files:
+            await message.reply_text("❌ **Batch files not found.** Please send them again.")
+            return
+
+        try:
+            names = batch_file_names(message.text.strip(), files)
+        except ValueError as e:
+            await message.reply_text(f"❌ **Invalid Pattern**\n\n{e}\nExample: `Show S01E{{n:02d}}`")
+            return
+        session.batch = None
+        state_store.save_session(message.from_user.id)
+
+        status_msg = await message.reply_text(f"📦 **Batch Started**\n\n**Files:** {len(files)}")
+        items = []
+        for file_msg, new_name in zip(files, names):
+            progress = TransferProgress(None, get_file_name(file_msg))
+            items.append((target_file_name(get_file_name(file_msg), new_name), get_file_size(file_msg), progress))
+        dashboard = BatchProgress(status_msg, items)
+        progress_ticker.register(dashboard)
+
+        jobs = []
+        for index, (file_msg, new_name) in enumerate(zip(files, names)):
+            progress = items[index][2]
+            job = Job(message.from_user.id, message.chat.id, get_file_name(file_msg), get_file_size(file_msg), progress)
+            jobs.append(job_manager.submit(
+                job, process_batch_item(client, message, file_msg, new_name, progress, dashboard, index)
+            ))
+
+        asyncio.ensure_future(finish_batch(dashboard, jobs))
+
+    async def process_batch_item(client, message, file_msg, new_name, progress, dashboard, index):
+        """One file of a batch; the scheduler keeps the batch within the user's slots"""
+        try:
+            result = await file_processor.send_cached(client, file_msg, new_name, message.chat.id)
+            if not result:
+                session = await state_store.load_session(message.from_user.id)
+                allowed, reason, retry_after = rate_limiter.reserve_bytes(session, get_file_size(file_msg))
+                state_store.save_session(message.from_user.id)
+                if not allowed:
+                    dashboard.finish(index, False, f"rate limit ({reason})")
+                    return {'success': False, 'error': f"Rate limit reached: {reason}"}
+                result = await job_scheduler.run(
+                    message.from_user.id,
+                    get_file_size(file_msg),
+                    lambda: file_processor.process_file(
+                        client=client,
+                        file_message=file_msg,
+                        new_filename=new_name,
+                        status_message=None,
+                        chat_id=message.chat.id,
+                        progress=progress
+                    ),
+                    progress
+                )
+            dashboard.finish(index, result['success'], result.get('error'))
+            return result
+        except asyncio.CancelledError:
+            dashboard.finish(index, False, "cancelled")
+            raise
+        except Exception as e:
+            dashboard.finish(index, False, str(e))
+
+    async def finish_batch(dashboard, jobs):
+        """Post the final batch summary once every job has ended"""
+        await asyncio.gather(*(job.task for job in jobs), return_exceptions=True)
+        await progress_ticker.unregister(dashboard)
         try:
-            file_msg = session['file_message']
-            result = await file_processor.process_file(
-                client=client,
-                file_message=file_msg,
-                new_filename=new_name,
-                status_message=status_msg,
-                chat_id=message.chat.id
+            await dashboard.status_message.edit_text(dashboard.render())
+        except Exception as e:
+            logger.warning(f"Batch summary failed: {e}")
+
+    async def process_file_rename(client, message, file_msg, new_name, status_msg, progress):
+        """Process file renaming with enhanced feedback"""
+        try:
+            result = await job_scheduler.run(
+                message.from_user.id,
+                get_file_size(file_msg),
+                lambda: file_processor.process_file(
+                    client=client,
+                    file_message=file_msg,
+                    new_filename=new_name,
+                    status_message=status_msg,
+                    chat_id=message.chat.id,
+                    progress=progress
+                ),
+                progress
             )
 
             if result['success']:
                 # Update user stats
                 user_id = message.from_user.id
-                if 'files_today' not in user_sessions[user_id]:
-                    user_sessions[user_id]['files_today'] = 0
-                user_sessions[user_id]['files_today'] += 1
+                (await state_store.load_session(user_id)).count_file()
+                state_store.save_session(user_id)
                 
                 success_msg = (
                     f"✅ **Processing Complete!**\n\n"
@@ -196,35 +422,30 @@ def setup_bot_handlers(client: Client):
                 await message.reply_text(success_msg)
             else:
                 await status_msg.edit_text(f"❌ **Error:** {result['error']}")
+            return result
 
+        except asyncio.CancelledError:
+            await status_msg.edit_text("🛑 **Job cancelled**")
+            raise
         except Exception as e:
             await status_msg.edit_text(f"❌ **Processing failed:** {str(e)}")
-        finally:
-            # Cleanup session
-            user_sessions.pop(message.from_user.id, None)
 
 # Helper functions
-async def check_rate_limit(user_id):
-    """Check if user is within rate limits"""
-    now = datetime.now()
-    session = user_sessions.get(user_id, {})
-    
-    if session.get('last_reset_date') != now.date():
-        session['files_today'] = 0
-        session['last_reset_date'] = now.date()
-    
-    last_file_time = session.get('last_file_time')
-    if last_file_time and (now - last_file_time) < timedelta(hours=1):
-        file_count = session.get('files_this_hour', 0)
-        if file_count >= Config.USER_RATE_LIMIT:
-            return False
-        session['files_this_hour'] = file_count + 1
+async def check_rate_limit(user_id, file_size):
+    """Check if user is within rate limits; returns (allowed, reason, retry_after)"""
+    session = await state_store.load_session(user_id)
+    allowed, reason, retry_after = rate_limiter.check_file(session, file_size)
+    if allowed:
+        state_store.save_session(user_id)
+    return allowed, reason, retry_after
+
+def rate_limit_text(reason, retry_after):
+    """Rejection message for the rate limiter"""
+    if retry_after is None:
+        wait = "This file is larger than your hourly allowance."
     else:
-        session['files_this_hour'] = 1
-        session['last_file_time'] = now
-    
-    user_sessions[user_id] = session
-    return True
+        wait = f"Try again in {format_time(retry_after)}."
+    return f"⏳ **Rate Limit Reached**\n\nLimit: {reason}\n{wait}"
 
 def get_file_size(message):
     """Extract file size from message"""
@@ -236,6 +457,53 @@ def get_file_name(message):
     file_obj = message.document or message.video or message.audio
     return getattr(file_obj, 'file_name', 'file')
 
+# Placeholders a batch pattern may use, and the format specs they may carry
+PATTERN_FIELDS = ('n', 'name')
+PATTERN_SPEC = re.compile(r"(?:.?[<>=^])?[+\- ]?#?0?(\d*)[,_]?(?:\.(\d+))?[bcdeEfFgGnosxX%]?")
+PATTERN_MAX_WIDTH = 100  # Longest valid filename
+
+
+def check_batch_pattern(pattern):
+    """Reject anything but plain {n} / {name} fields with modest widths
+
+    str.format would otherwise follow attribute and index lookups, and a
+    huge width allocates the padded string before any length check.
+    """
+    try:
+        fields = list(string.Formatter().parse(pattern))
+    except ValueError as e:
+        raise ValueError(f"Malformed pattern: {e}")
+    for _, field, spec, conversion in fields:
+        if field is None:
+            continue
+        if field not in PATTERN_FIELDS or conversion:
+            raise ValueError(f"Unsupported placeholder: `{{{field}{'!' + conversion if conversion else ''}}}`")
+        match = PATTERN_SPEC.fullmatch(spec or '')
+        if not match or any(int(size or 0) > PATTERN_MAX_WIDTH for size in match.groups()):
+            raise ValueError(f"Unsupported format: `{{{field}:{spec}}}`")
+    # Some specs only fail for the type they meet, e.g. {name:%} or {n:,}
+    try:
+        pattern.format(n=1, name='name')
+    except ValueError as e:
+        raise ValueError(f"Unsupported format: {e}")
+
+
+def batch_file_names(pattern, files):
+    """New names for a batch from a pattern such as `Show S01E{n:02d}`"""
+    check_batch_pattern(pattern)
+    names = []
+    for n, file_msg in enumerate(files, start=1):
+        try:
+            name = pattern.format(n=n, name=os.path.splitext(get_file_name(file_msg))[0]).strip()
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"Unsupported placeholder: {e}")
+        if not is_valid_filename(name):
+            raise ValueError(f"Invalid filename: `{name}`")
+        names.append(name)
+    if len(set(names)) < len(names):
+        raise ValueError("The pattern must contain `{n}` so every file gets its own name")
+    return names
+
 def is_valid_filename(name):
     """Validate filename"""
     if not name or len(name) > 100:
@@ -0,0 +1,181 @@
+import math
+import time
+import asyncio
+from config import Config
+from metrics import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Telegram only accepts power-of-two part sizes in these ranges
+DOWNLOAD_PART_LIMITS = (4 * 1024, 1024 * 1024)  # upload.getFile, never crossing a 1MB boundary
+UPLOAD_PART_LIMITS = (1024, 512 * 1024)  # upload.saveFilePart / saveBigFilePart
+UPLOAD_MAX_PARTS = 4000  # Parts per file on a regular account
+
+
+def valid_part_size(size, limits):
+    """Whether Telegram accepts `size` as a part size"""
+    low, high = limits
+    return isinstance(size, int) and low <= size <= high and size & (size - 1) == 0
+
+
+class LinkStats:
+    """What earlier transfers learned about one direction and data center"""
+
+    def __init__(self, part_size, window):
+        self.part_size = part_size
+        self.window = window
+        self.throughput = 0.0  # EWMA of per-transfer bytes per second
+        self.error_rate = 0.0  # EWMA of the share of failed parts
+
+
+class TransferTuner:
+    """In-flight window of one transfer, steered by its measured throughput
+
+    Throughput is sampled every CHUNK_TUNE_INTERVAL seconds and smoothed
+    with an EWMA. The window moves one part at a time while throughput keeps
+    improving, turns round when it drops, holds when it is flat, and halves
+    when a part fails. Workers beyond the window wait in slot().
+    """
+
+    def __init__(self, tuner, key, part_size):
+        self.tuner = tuner
+        self.key = key
+        self.stats = tuner.links[key]
+        self.part_size = part_size
+        self.window = self.stats.window
+        self.step = 1
+        self.throughput = 0.0
+        self.previous = 0.0  # EWMA when the window last moved
+        self.sample_bytes = 0
+        self.sample_start = None
+        self.started_at = None
+        self.total_bytes = 0
+        self.parts = 0
+        self.errors = 0
+        self.draining = False
+        self.changed = asyncio.Event()
+
+    async def slot(self, worker_index):
+        """Wait until worker `worker_index` falls inside the window"""
+        while worker_index >= self.window and not self.draining:
+            self.changed.clear()
+            await self.changed.wait()
+
+    def drain(self):
+        """No more parts will come; release every waiting worker"""
+        self.draining = True
+        self.changed.set()
+
+    def record(self, size):
+        """A part of `size` bytes completed"""
+        now = time.monotonic()
+        if self.sample_start is None:
+            self.sample_start = self.started_at = now
+        self.parts += 1
+        self.total_bytes += size
+        self.sample_bytes += size
+        elapsed = now - self.sample_start
+        if elapsed < Config.CHUNK_TUNE_INTERVAL:
+            return
+        rate = self.sample_bytes / elapsed
+        self.sample_bytes = 0
+        self.sample_start = now
+        alpha = Config.CHUNK_EWMA_ALPHA
+        self.throughput = alpha * rate + (1 - alpha) * self.throughput if self.throughput else rate
+        self.adjust()
+
+    def adjust(self):
+        if self.previous:
+            change = (self.throughput - self.previous) / self.previous
+            if change <= -Config.CHUNK_TUNE_THRESHOLD:
+                # The last move hurt; go back the other way
+                self.step = -self.step
+            elif change < Config.CHUNK_TUNE_THRESHOLD:
+                return
+        self.previous = self.throughput
+        self.resize(self.window + self.step)
+
+    def failed(self):
+        """A part failed; back off before the link gets worse"""
+        self.errors += 1
+        self.step = 1
+        self.previous = 0.0
+        self.resize(self.window // 2)
+
+    def resize(self, window):
+        window = max(Config.MIN_TRANSFER_WINDOW, min(Config.MAX_TRANSFER_WINDOW, window))
+        if window > self.window:
+            self.changed.set()
+        self.window = window
+
+    def finish(self):
+        """Hand what this transfer measured to the next one on the same link"""
+        self.tuner.learn(self)
+
+
+class ChunkTuner:
+    """Part size and starting window per transfer direction and data center
+
+    Transfers start from the window the previous one on the same link ended
+    with. Part sizes halve while parts keep failing, so a retry loses less,
+    and double back once the link is clean.
+    """
+
+    def __init__(self):
+        self.links = {}  # (direction, dc_id) -> LinkStats
+
+    def link(self, direction, dc_id=None):
+        key = (direction, dc_id)
+        if key not in self.links:
+            if direction == 'download':
+                self.links[key] = LinkStats(Config.DOWNLOAD_CHUNK_SIZE, Config.DOWNLOAD_PARALLELISM)
+            else:
+                self.links[key] = LinkStats(Config.CHUNK_SIZE, Config.UPLOAD_PARTS_IN_FLIGHT)
+        return key
+
+    def part_size(self, direction, file_size, dc_id=None):
+        """Part size for a new transfer, within the protocol limits"""
+        stats = self.links[self.link(direction, dc_id)]
+        low, high = DOWNLOAD_PART_LIMITS if direction == 'download' else UPLOAD_PART_LIMITS
+        size = stats.part_size
+        if direction == 'upload':
+            # Too many parts and Telegram rejects the file
+            size = max(size, 2 ** math.ceil(math.log2(max(1, math.ceil(file_size / UPLOAD_MAX_PARTS)))))
+        return max(low, min(high, size))
+
+    def start(self, direction, part_size, dc_id=None):
+        """Tuner for one transfer attempt using `part_size` parts"""
+        return TransferTuner(self, self.link(direction, dc_id), part_size)
+
+    def learn(self, transfer):
+        stats = transfer.stats
+        alpha = Config.CHUNK_EWMA_ALPHA
+        stats.window = transfer.window
+
+        attempted = transfer.parts + transfer.errors
+        if attempted:
+            error_rate = transfer.errors / attempted
+            stats.error_rate = alpha * error_rate + (1 - alpha) * stats.error_rate
+            low, high = DOWNLOAD_PART_LIMITS if transfer.key[0] == 'download' else UPLOAD_PART_LIMITS
+            if stats.error_rate > Config.CHUNK_ERROR_RATE:
+                stats.part_size = max(max(low, Config.MIN_CHUNK_SIZE), transfer.part_size // 2)
+            else:
+                stats.part_size = min(high, transfer.part_size * 2)
+
+        elapsed = time.monotonic() - transfer.started_at if transfer.started_at else 0
+        if elapsed > 0:
+            rate = transfer.total_bytes / elapsed
+            stats.throughput = alpha * rate + (1 - alpha) * stats.throughput if stats.throughput else rate
+
+        label = "{}_dc{}".format(*transfer.key) if transfer.key[1] else transfer.key[0]
+        metrics.transfer_window.set(stats.window, label)
+        metrics.transfer_part_bytes.set(stats.part_size, label)
+        logger.debug(
+            f"{label}: window {stats.window}, part {stats.part_size // 1024}KB, "
+            f"{stats.throughput / 1024 / 1024:.1f}MB/s, errors {stats.error_rate:.1%}"
+        )
+
+
+# Process-wide tuner shared by every download and upload
+chunk_tuner = ChunkTuner()
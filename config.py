@@ -9,19 +9,128 @@ class Config:
     # Bot Settings
     LOG_CHANNEL = int(os.getenv("LOG_CHANNEL", ""))  # Required for logging
     
+    # Web Server Settings
+    WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+    WEB_PORT = int(os.getenv("PORT", "5000"))
+
+    # HTTP Job API (disabled unless a token is set)
+    API_TOKEN = os.getenv("API_TOKEN", "")
+    API_USER_ID = 0  # Scheduler/rate-limit identity of API jobs
+    API_MAX_JOBS = int(os.getenv("API_MAX_JOBS", "4"))  # Running API jobs; replaces MAX_JOBS_PER_USER for them
+    API_JOB_HISTORY = 1000  # Finished jobs kept for status queries
+    API_PROGRESS_INTERVAL = 1  # Seconds between SSE/long-poll progress checks
+    API_LONG_POLL_MAX = 60
+    
     # Performance Settings
     MAX_WORKERS = 100
     MAX_CONCURRENT_DOWNLOADS = 3
     MAX_CONCURRENT_UPLOADS = 3
     
+    # Scheduler Settings
+    MAX_ACTIVE_JOBS = 6  # Rename jobs running at once
+    MAX_JOBS_PER_USER = 2  # Running jobs per user
+    FAST_LANE_SLOTS = 2  # Extra slots reserved for small files
+    SMALL_FILE_SIZE = 20 * 1024 * 1024  # Files up to this size use the fast lane
+    
+    # Streaming Settings (download piped straight into the upload)
+    STREAMING_MODE = os.getenv("STREAMING_MODE", "false").lower() == "true"
+    STREAM_BUFFER_PARTS = 16  # Upload parts held in memory (8MB at 512KB)
+    
+    # Parallel Download Settings
+    DOWNLOAD_CONNECTIONS = 4  # Media connections per download
+    DOWNLOAD_PARALLELISM = 8  # Range requests in flight when a download starts
+    PARALLEL_DOWNLOAD_MIN_SIZE = 20 * 1024 * 1024  # Smaller files use a single stream
+    DOWNLOAD_JOURNAL_INTERVAL = 2  # Seconds between syncs of the resume journal
+    
+    # Parallel Upload Settings
+    UPLOAD_CONNECTIONS = 4  # Media connections per upload
+    UPLOAD_PARTS_IN_FLIGHT = 8  # Parts sent concurrently when an upload starts
+    UPLOAD_PART_RETRIES = 3
+    PARALLEL_UPLOAD_MIN_SIZE = 10 * 1024 * 1024  # Smaller files use send_document
+    
+    # Transfer Retry Settings
+    TRANSFER_MAX_ATTEMPTS = 5  # Per download, upload or stream
+    RETRY_BACKOFF = {'network': (1, 30), 'server': (2, 60)}  # Error class -> (first delay, cap) seconds
+    STALL_TIMEOUT = 60  # Seconds without byte progress before a transfer is restarted
+    STALL_CHECK_INTERVAL = 5
+
+    # Adaptive Chunk Settings (part size and window follow measured throughput)
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # Starting upload.getFile size; powers of two, 4KB-1MB
+    CHUNK_SIZE = 512 * 1024  # Starting upload part size; powers of two, 1KB-512KB
+    MIN_CHUNK_SIZE = 64 * 1024  # Error-prone links shrink parts down to this
+    MIN_TRANSFER_WINDOW = 2  # Parts in flight per transfer
+    MAX_TRANSFER_WINDOW = 32
+    CHUNK_TUNE_INTERVAL = 0.5  # Seconds per throughput sample
+    CHUNK_EWMA_ALPHA = 0.5  # Weight of the newest sample
+    CHUNK_TUNE_THRESHOLD = 0.05  # Throughput change that counts as better or worse
+    CHUNK_ERROR_RATE = 0.05  # Share of failed parts above which parts shrink
+    
+    # Staging Settings (one directory and disk reservation per download)
+    STAGING_DIR = os.path.join("downloads", "staging")
+    STAGING_FREE_MARGIN = int(os.getenv("STAGING_FREE_MARGIN", str(2 * 1024 * 1024 * 1024)))  # Never reserved
+    STAGING_WAIT_TIMEOUT = 1800  # Seconds a download may wait for disk space before failing
+    STAGING_RECHECK_INTERVAL = 10  # Seconds between free-space checks while waiting
+    PARTIAL_MAX_AGE = 24 * 3600  # Interrupted downloads are kept this long for resuming
+    
+    # Download Cache Settings
+    CACHE_DIR = os.path.join("downloads", "cache")
+    CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(20 * 1024 * 1024 * 1024)))  # 0 disables
+    CACHE_MAX_ENTRY_FRACTION = 0.5  # Largest cacheable file, as a share of the quota
+    CACHE_SIZE_AGE_PENALTY = 24 * 3600  # A file filling the whole quota ages this many seconds faster
+    CACHE_INDEX_FLUSH_DELAY = 5  # Seconds index changes wait so one background write covers them
+    
+    # State Store Settings (sessions and job records, written behind)
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///" + os.path.join("downloads", "bot_state.db"))
+    STATE_FLUSH_INTERVAL = 2  # Seconds between background writes
+    STATE_FLUSH_MAX_PENDING = 500  # Dirty records that trigger an early flush
+    SESSION_IDLE_TTL = 3600  # Idle sessions leave memory after this many seconds
+    SESSION_WHEEL_RESOLUTION = 10  # Expiry granularity in seconds
+    
+    # Upload Index Settings (repeat requests answered with send_cached_media)
+    UPLOAD_INDEX_PATH = os.path.join("downloads", "upload_index.json")
+    UPLOAD_INDEX_MAX_ENTRIES = 100000
+    UPLOAD_INDEX_FLUSH_DELAY = 5  # Seconds changes wait so one background write covers them
+    
+    # Progress Settings
+    PROGRESS_TICK_INTERVAL = 1  # Seconds between ticker passes
+    PROGRESS_EDITS_PER_SECOND = 10  # Global status-edit budget
+    PROGRESS_MIN_EDIT_INTERVAL = 5  # Seconds between edits of one message
+    
     # Thumbnail Settings
     CUSTOM_THUMBNAIL = "https://envs.sh/5l9.jpg"
     THUMBNAIL_SIZE = (320, 320)
+    THUMBNAIL_WORKERS = 2
+    USER_THUMB_DIR = "thumbnails"  # Per-user thumbnails set by sending a photo
+    USER_THUMB_CACHE_BYTES = 32 * 1024 * 1024  # Encoded thumbnails kept in memory
+    USER_THUMB_MISSING_SIZE = 10000  # Users without a thumbnail remembered, to skip the disk check
+    VIDEO_THUMBNAILS = True  # Frame thumbnails for video documents
+    FFMPEG_WORKERS = 2
+    FFMPEG_TIMEOUT = 20  # Seconds per frame extraction
+    VIDEO_THUMB_HEAD_BYTES = 8 * 1024 * 1024  # Leading bytes handed to ffmpeg
+    VIDEO_THUMB_CACHE_SIZE = 1000  # Frames kept per file_unique_id
+    VIDEO_THUMB_WAIT = 3  # Seconds an upload waits for a frame still being extracted
+    IMAGE_THUMBNAILS = True  # JPEG/PNG/WebP documents get themselves as thumbnail
+    IMAGE_THUMB_WORKERS = 2
+    IMAGE_THUMB_CPU_SECONDS = 3  # CPU time cap per image
+    IMAGE_THUMB_MAX_PIXELS = 60_000_000  # Checked from the header, after JPEG draft scaling
+    IMAGE_THUMB_CACHE_SIZE = 1000
     
     # File Limits
     MAX_FILE_SIZE = 4 * 1024 * 1024 * 1024  # 4GB
+    MAX_BATCH_FILES = 50  # Files collected by /batch or an album
     USER_RATE_LIMIT = 20
     
+    # Rate Limit Settings (sliding windows, checked before any transfer starts)
+    RATE_LIMIT_WINDOW = 3600
+    RATE_LIMIT_TIERS = {
+        'default': {'files': USER_RATE_LIMIT, 'bytes': 20 * 1024 ** 3},
+        'premium': {'files': 200, 'bytes': 200 * 1024 ** 3},
+    }
+    PREMIUM_USERS = {int(uid) for uid in os.getenv("PREMIUM_USERS", "").split(",") if uid.strip()}
+    GLOBAL_BYTES_PER_HOUR = int(os.getenv("GLOBAL_BYTES_PER_HOUR", str(1024 ** 4)))  # 0 disables
+    
     # Logging Settings
+    LOG_DIGEST_INTERVAL = 30  # Seconds between log-channel digests
+    LOG_QUEUE_SIZE = 1000  # Queued events before low-value ones are dropped
     LOG_UPLOADS = True
     LOG_DOWNLOADS = True
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from config import Config
+from metrics import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FileCache:
+    """On-disk LRU cache of downloaded files keyed by Telegram file_unique_id"""
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or Config.CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else Config.CACHE_MAX_BYTES
+        self.index_path = os.path.join(self.root, "index.json")
+        self.entries = OrderedDict()  # unique_id -> {'file', 'size', 'last_used'}, oldest first
+        self.pins = {}  # unique_id -> active readers
+        self.total_bytes = 0
+        self.loaded = False
+        self.dirty = False
+        self.flusher = None
+        self.write_lock = threading.Lock()  # a cancelled flush may still be writing
+
+    def load(self):
+        """Restore the index from disk, dropping entries whose file vanished"""
+        if self.loaded:
+            return
+        self.loaded = True
+        os.makedirs(self.root, exist_ok=True)
+
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+
+        for unique_id, entry in sorted(stored.items(), key=lambda item: item[1]['last_used']):
+            path = os.path.join(self.root, entry['file'])
+            if os.path.exists(path) and os.path.getsize(path) == entry['size']:
+                self.entries[unique_id] = entry
+                self.total_bytes += entry['size']
+
+        # Files left behind by a crash between a move and an index write
+        known = {entry['file'] for entry in self.entries.values()} | {"index.json"}
+        for name in os.listdir(self.root):
+            if name not in known:
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+
+        logger.info(f"File cache: {len(self.entries)} files, {self.total_bytes} bytes")
+
+    def lookup(self, unique_id):
+        """Return the cached path and pin it, or None on a miss"""
+        self.load()
+        entry = self.entries.get(unique_id)
+        if not entry:
+            return None
+
+        path = os.path.join(self.root, entry['file'])
+        if not os.path.exists(path):
+            self.drop(unique_id)
+            return None
+
+        entry['last_used'] = time.time()
+        self.entries.move_to_end(unique_id)
+        self.pins[unique_id] = self.pins.get(unique_id, 0) + 1
+        self.mark_dirty()
+        return path
+
+    def store(self, unique_id, src_path):
+        """Move a downloaded file into the cache and pin it; None if it doesn't fit"""
+        self.load()
+        size = os.path.getsize(src_path)
+        if not self.max_bytes or size > self.max_bytes * Config.CACHE_MAX_ENTRY_FRACTION:
+            return None
+
+        if unique_id in self.entries:
+            # Another job cached it first
+            os.remove(src_path)
+            return self.lookup(unique_id)
+
+        if not self.evict(size):
+            return None
+
+        file_name = f"{unique_id}{os.path.splitext(src_path)[1]}"
+        path = os.path.join(self.root, file_name)
+        os.replace(src_path, path)
+
+        self.entries[unique_id] = {'file': file_name, 'size': size, 'last_used': time.time()}
+        self.total_bytes += size
+        self.pins[unique_id] = self.pins.get(unique_id, 0) + 1
+        self.mark_dirty()
+        return path
+
+    def release(self, unique_id):
+        """Unpin a file after its reader is done"""
+        count = self.pins.get(unique_id, 0) - 1
+        if count > 0:
+            self.pins[unique_id] = count
+        else:
+            self.pins.pop(unique_id, None)
+
+    def evict(self, needed):
+        """Free room for `needed` bytes; large and stale files go first"""
+        excess = self.total_bytes + needed - self.max_bytes
+        if excess <= 0:
+            return True
+        # Pinned files stay; if evicting everything else is not enough, keep the cache intact
+        if excess > self.evictable():
+            return False
+        self.free(excess)
+        return True
+
+    def evictable(self):
+        """Bytes held by files no job is reading"""
+        self.load()
+        return sum(entry['size'] for unique_id, entry in self.entries.items() if unique_id not in self.pins)
+
+    def free(self, size):
+        """Evict unpinned files until `size` bytes are freed; returns the bytes freed"""
+        now = time.time()
+
+        def priority(item):
+            unique_id, entry = item
+            # Recency, discounted by how much of the quota the file occupies
+            return entry['last_used'] - (entry['size'] / max(1, self.max_bytes)) * Config.CACHE_SIZE_AGE_PENALTY
+
+        victims = sorted(
+            (item for item in self.entries.items() if item[0] not in self.pins),
+            key=priority
+        )
+        freed = 0
+        for unique_id, entry in victims:
+            if freed >= size:
+                break
+            logger.debug(f"Evicting {unique_id} (idle {now - entry['last_used']:.0f}s)")
+            self.drop(unique_id)
+            freed += entry['size']
+
+        if freed:
+            self.mark_dirty()
+        return freed
+
+    def drop(self, unique_id):
+        entry = self.entries.pop(unique_id, None)
+        if not entry:
+            return
+        self.total_bytes -= entry['size']
+        try:
+            os.remove(os.path.join(self.root, entry['file']))
+        except OSError:
+            pass
+
+    def mark_dirty(self):
+        """Schedule an index write; changes within CACHE_INDEX_FLUSH_DELAY share one
+
+        A crash before the write only loses cache entries: load() drops
+        indexed files that vanished and deletes files the index lacks.
+        """
+        self.dirty = True
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.ensure_future(self.run_flusher())
+
+    async def run_flusher(self):
+        while self.dirty:
+            await asyncio.sleep(Config.CACHE_INDEX_FLUSH_DELAY)
+            await self.flush()
+
+    async def flush(self):
+        """Write the index from a worker thread, off the event loop"""
+        if not self.dirty:
+            return
+        self.dirty = False
+        # lookup() updates entries in place, so copy them for the writer thread
+        entries = OrderedDict((unique_id, dict(entry)) for unique_id, entry in self.entries.items())
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.save, entries)
+
+    async def stop(self):
+        """Write pending changes before shutdown"""
+        if self.flusher:
+            self.flusher.cancel()
+            await asyncio.gather(self.flusher, return_exceptions=True)
+            self.flusher = None
+        await self.flush()
+
+    def save(self, entries):
+        """Atomically persist the index; runs in an executor thread"""
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            with self.write_lock:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"File cache index save failed: {e}")
+
+
+# Process-wide download cache
+file_cache = FileCache()
+metrics.gauge("renamer_cache_bytes", "Bytes held by the download cache", lambda: file_cache.total_bytes)
@@ -2,14 +2,17 @@ import time
 import asyncio
 import aiofiles
 import os
-from pathlib import Path
 from pyrogram.types import Message
 from pyrogram.errors import FloodWait, RPCError
 from config import Config
-from PIL import Image, ImageDraw, ImageFont
+from parallel_downloader import ParallelDownloader, CdnRedirect
+from progress_ticker import TransferProgress, progress_ticker
+from thumbnail_registry import thumbnail_registry
+from staging import staging_manager, StagingFull
+from transfer_retry import retry_transfer, completed
+from metrics import metrics
 import logging
 from concurrent.futures import ThreadPoolExecutor
-import shutil
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -17,115 +20,20 @@ logger = logging.getLogger(__name__)
 # Thread pool for CPU-intensive operations
 thread_pool = ThreadPoolExecutor(max_workers=Config.MAX_CONCURRENT_DOWNLOADS)
 
+# Process-wide transfer limits (per-call semaphores would limit nothing)
+download_semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_DOWNLOADS)
+upload_semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_UPLOADS)
+
 class TurboFileHandler:
     """
     Turbo-optimized file handler with custom thumbnail support and extreme speed.
     """
     def __init__(self):
-        self.download_semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_DOWNLOADS)
-        self.upload_semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_UPLOADS)
-        self.thumbnail_path = self._load_or_create_thumbnail()
-        self.progress_cache = {}  # Cache progress updates to reduce API calls
-
-    def _load_or_create_thumbnail(self):
-        """Load existing thumbnail or create a default one."""
-        thumbnail_path = Config.CUSTOM_THUMBNAIL
-        
-        # Check if custom thumbnail exists
-        if os.path.exists(thumbnail_path):
-            try:
-                # Validate and optimize thumbnail
-                with Image.open(thumbnail_path) as img:
-                    img.thumbnail(Config.THUMBNAIL_SIZE)
-                    logger.info(f"Custom thumbnail loaded: {thumbnail_path}")
-                return thumbnail_path
-            except Exception as e:
-                logger.warning(f"Failed to load custom thumbnail: {e}")
-        
-        # Create default thumbnail
-        return self._create_default_thumbnail()
-
-    def _create_default_thumbnail(self):
-        """Create a default thumbnail for the bot."""
-        try:
-            # Create a modern-looking thumbnail
-            img = Image.new('RGB', Config.THUMBNAIL_SIZE, color='#2563eb')
-            draw = ImageDraw.Draw(img)
-            
-            # Try to use a nice font, fallback to default
-            try:
-                font_large = ImageFont.truetype("arialbd.ttf", 32)
-                font_small = ImageFont.truetype("arial.ttf", 16)
-            except:
-                try:
-                    font_large = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 32)
-                    font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16)
-                except:
-                    font_large = ImageFont.load_default()
-                    font_small = ImageFont.load_default()
-
-            # Draw main text
-            text = "TURBO BOT"
-            bbox = draw.textbbox((0, 0), text, font=font_large)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            
-            x = (Config.THUMBNAIL_SIZE[0] - text_width) // 2
-            y = (Config.THUMBNAIL_SIZE[1] - text_height) // 2 - 20
-            
-            draw.text((x, y), text, font=font_large, fill='white')
-            
-            # Draw subtitle
-            subtitle = "File Renamer"
-            bbox_sub = draw.textbbox((0, 0), subtitle, font=font_small)
-            sub_width = bbox_sub[2] - bbox_sub[0]
-            x_sub = (Config.THUMBNAIL_SIZE[0] - sub_width) // 2
-            draw.text((x_sub, y + text_height + 10), subtitle, font=font_small, fill='#d1d5db')
-            
-            # Save thumbnail
-            img.save("default_thumbnail.jpg", "JPEG", quality=95)
-            logger.info("Default thumbnail created successfully")
-            return "default_thumbnail.jpg"
-            
-        except Exception as e:
-            logger.error(f"Failed to create default thumbnail: {e}")
-            return None
-
-    async def optimize_thumbnail(self, thumbnail_path):
-        """Optimize thumbnail for faster uploads."""
-        if not thumbnail_path or not os.path.exists(thumbnail_path):
-            return None
-            
-        try:
-            optimized_path = f"optimized_{os.path.basename(thumbnail_path)}"
-            
-            # Run in thread pool to avoid blocking
-            await asyncio.get_event_loop().run_in_executor(
-                thread_pool, 
-                self._optimize_thumbnail_sync, 
-                thumbnail_path, 
-                optimized_path
-            )
-            
-            return optimized_path if os.path.exists(optimized_path) else thumbnail_path
-        except Exception as e:
-            logger.warning(f"Thumbnail optimization failed: {e}")
-            return thumbnail_path
+        self.download_semaphore = download_semaphore
+        self.upload_semaphore = upload_semaphore
+        # Shared, pre-encoded thumbnail: no PIL work or file writes per handler
+        self.thumbnail = thumbnail_registry.global_thumbnail()
 
-    def _optimize_thumbnail_sync(self, input_path, output_path):
-        """Synchronous thumbnail optimization."""
-        try:
-            with Image.open(input_path) as img:
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Optimize size and quality
-                img.thumbnail(Config.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-                img.save(output_path, "JPEG", optimize=True, quality=85)
-        except Exception as e:
-            logger.error(f"Thumbnail optimization error: {e}")
-            shutil.copy2(input_path, output_path)
 
 async def download_file_turbo(message: Message, status_message: Message):
     """
@@ -140,7 +48,8 @@ async def download_file_turbo(message: Message, status_message: Message):
     """
     handler = TurboFileHandler()
     start_time = time.time()
-    download_id = f"{message.chat.id}_{message.id}"
+    area = None
+    file_path = None
     
     async with handler.download_semaphore:
         try:
@@ -168,18 +77,39 @@ async def download_file_turbo(message: Message, status_message: Message):
                 f"**Status:** Preparing..."
             )
 
-            # Create downloads directory
-            download_dir = Path("downloads")
-            download_dir.mkdir(exist_ok=True)
+            # Private staging directory; cleanup_files gives the space back
+            try:
+                area = await staging_manager.reserve(
+                    file_size, key=getattr(file_to_download, 'file_unique_id', None)
+                )
+            except StagingFull as e:
+                await status_message.edit_text(f"❌ **Download error:** {str(e)}")
+                return None
 
             # Download with turbo optimization
-            file_path = await message.download(
-                file_name=str(download_dir / file_name),
-                progress=_turbo_progress_callback,
-                progress_args=(status_message, start_time, "📥 DOWNLOADING", download_id, handler),
-                chunk_size=Config.CHUNK_SIZE * 4,  # Larger chunks for speed
-                max_connections=4  # Multiple connections for large files
-            )
+            file_path = None
+            target_path = area.path_for(file_name)
+            progress = TransferProgress(status_message, file_name)
+            progress.set_phase('DOWNLOADING', file_size)
+            progress_ticker.register(progress)
+            try:
+                if file_size >= Config.PARALLEL_DOWNLOAD_MIN_SIZE:
+                    # Multiple connections for large files
+                    try:
+                        file_path = await retry_transfer(lambda: ParallelDownloader().download(
+                            message._client, file_to_download, os.path.abspath(target_path),
+                            progress.on_progress
+                        ), progress, "Download")
+                    except CdnRedirect:
+                        logger.info("CDN redirect, falling back to single-stream download")
+
+                if not file_path:
+                    file_path = await retry_transfer(lambda: completed(message.download(
+                        file_name=target_path,
+                        progress=progress.on_progress
+                    ), "Download"), progress, "Download")
+            finally:
+                await progress_ticker.unregister(progress)
 
             if file_path and os.path.exists(file_path):
                 actual_size = os.path.getsize(file_path)
@@ -198,12 +128,12 @@ async def download_file_turbo(message: Message, status_message: Message):
                 return None
 
         except FloodWait as e:
-            wait_time = e.value
+            # Still flooded after every retry; waiting here would only hold the slot
+            metrics.flood_waits.inc(1, 'download')
             await status_message.edit_text(
                 f"⏳ **Rate limit reached**\n\n"
-                f"Please wait {wait_time} seconds before trying again."
+                f"Please wait {e.value} seconds before trying again."
             )
-            await asyncio.sleep(wait_time)
             return None
             
         except RPCError as e:
@@ -214,6 +144,10 @@ async def download_file_turbo(message: Message, status_message: Message):
             await status_message.edit_text(f"❌ **Download error:** {str(e)}")
             logger.error(f"Download failed: {e}")
             return None
+        finally:
+            # A returned file keeps its space until cleanup_files
+            if area and not (file_path and os.path.exists(file_path)):
+                area.release()
 
 async def upload_file_turbo(client, chat_id, file_path, status_message: Message, caption=""):
     """
@@ -232,7 +166,6 @@ async def upload_file_turbo(client, chat_id, file_path, status_message: Message,
 
     handler = TurboFileHandler()
     start_time = time.time()
-    upload_id = f"{chat_id}_{os.path.basename(file_path)}"
     
     async with handler.upload_semaphore:
         try:
@@ -246,24 +179,27 @@ async def upload_file_turbo(client, chat_id, file_path, status_message: Message,
                 f"**Status:** Preparing..."
             )
 
-            # Optimize thumbnail
-            thumb = await handler.optimize_thumbnail(handler.thumbnail_path)
-            
-            # Upload parameters for maximum speed
+            # Upload parameters; pyrogram picks its own part size for send_document
+            progress = TransferProgress(status_message, file_name)
+            progress.set_phase('UPLOADING', file_size)
             upload_kwargs = {
                 'chat_id': chat_id,
                 'document': file_path,
                 'caption': caption,
-                'thumb': thumb,
-                'progress': _turbo_progress_callback,
-                'progress_args': (status_message, start_time, "📤 UPLOADING", upload_id, handler),
-                'chunk_size': Config.CHUNK_SIZE * 4,
+                'progress': progress.on_progress,
                 'disable_notification': True,  # Faster without notifications
                 'force_document': True,  # Always as document for consistency
             }
 
             # Perform upload
-            await client.send_document(**upload_kwargs)
+            progress_ticker.register(progress)
+            try:
+                # A fresh thumbnail stream per attempt
+                await retry_transfer(lambda: completed(client.send_document(
+                    thumb=handler.thumbnail.as_file() if handler.thumbnail else None, **upload_kwargs
+                ), "Upload"), progress, "Upload")
+            finally:
+                await progress_ticker.unregister(progress)
             
             upload_time = time.time() - start_time
             speed = file_size / upload_time if upload_time > 0 else 0
@@ -281,12 +217,12 @@ async def upload_file_turbo(client, chat_id, file_path, status_message: Message,
                 pass  # Silent fail if message already deleted
 
         except FloodWait as e:
-            wait_time = e.value
+            # Still flooded after every retry; waiting here would only hold the slot
+            metrics.flood_waits.inc(1, 'upload')
             await status_message.edit_text(
                 f"⏳ **Upload rate limit**\n\n"
-                f"Please wait {wait_time} seconds before trying again."
+                f"Please wait {e.value} seconds before trying again."
             )
-            await asyncio.sleep(wait_time)
             
         except RPCError as e:
             await status_message.edit_text(f"❌ **Upload error:** {str(e)}")
@@ -295,58 +231,6 @@ async def upload_file_turbo(client, chat_id, file_path, status_message: Message,
             await status_message.edit_text(f"❌ **Upload failed:** {str(e)}")
             logger.error(f"Upload failed: {e}")
 
-async def _turbo_progress_callback(current, total, status_message: Message, start_time, action, operation_id, handler):
-    """
-    Ultra-optimized progress callback with minimal API calls and caching.
-    """
-    if total == 0:
-        return
-
-    current_time = time.time()
-    elapsed = current_time - start_time
-    
-    # Cache progress to avoid too many API calls
-    cache_key = f"{operation_id}_{int(current/total*100)}"
-    if cache_key in handler.progress_cache:
-        if current_time - handler.progress_cache[cache_key] < 2.0:  # 2-second cache
-            return
-    
-    handler.progress_cache[cache_key] = current_time
-    
-    # Clean old cache entries
-    current_cache = handler.progress_cache.copy()
-    for key, timestamp in current_cache.items():
-        if current_time - timestamp > 30:  # 30-second cache lifetime
-            handler.progress_cache.pop(key, None)
-
-    percentage = (current / total) * 100
-    speed = current / elapsed if elapsed > 0 else 0
-    eta = (total - current) / speed if speed > 0 else 0
-    
-    # Create progress bar
-    filled_length = int(30 * percentage // 100)
-    bar = '█' * filled_length + '░' * (30 - filled_length)
-    
-    # Format progress text
-    progress_text = (
-        f"**{action}**\n\n"
-        f"`{bar}`\n"
-        f"**Progress:** {percentage:.1f}%\n"
-        f"**Speed:** {_format_bytes(speed)}/s\n"
-        f"**ETA:** {_format_time(eta)} | **Elapsed:** {_format_time(elapsed)}\n"
-        f"`{_format_bytes(current)} / {_format_bytes(total)}`"
-    )
-    
-    try:
-        # Only update if text has changed significantly
-        if (not hasattr(status_message, 'last_progress_text') or 
-            status_message.last_progress_text != progress_text):
-            await status_message.edit_text(progress_text)
-            status_message.last_progress_text = progress_text
-    except Exception as e:
-        # Silent fail to avoid breaking the upload/download
-        pass
-
 def _format_bytes(size):
     """Ultra-fast bytes formatting."""
     if not size or size <= 0:
@@ -389,6 +273,8 @@ async def cleanup_files(*file_paths):
                 logger.debug(f"Cleaned up file: {file_path}")
             except Exception as e:
                 logger.warning(f"Failed to cleanup {file_path}: {e}")
+        if file_path:
+            staging_manager.release_path(file_path)
 
 async def get_file_info(file_path):
     """
@@ -5,6 +5,17 @@ from pyrogram.types import Message
 from config import Config
 from turbo_uploader import TurboUploader
 from turbo_downloader import TurboDownloader
+from turbo_streamer import TurboStreamer
+from part_uploader import target_file_name
+from progress_ticker import TransferProgress, progress_ticker
+from file_cache import file_cache
+from upload_index import upload_index
+from staging import staging_manager, StagingFull
+from user_thumbnails import user_thumbnails
+from metrics import metrics
+from log_pipeline import log_pipeline, LogEvent, PRIORITY_SUCCESS, PRIORITY_FAILURE, PRIORITY_FORWARD
+from video_thumbnails import video_thumbnailer, is_video
+from image_thumbnails import image_thumbnailer, is_image
 import logging
 from datetime import datetime
 
@@ -16,57 +27,210 @@ class TurboFileProcessor:
     def __init__(self):
         self.downloader = TurboDownloader()
         self.uploader = TurboUploader()
+        self.streamer = TurboStreamer()
 
-    async def process_file(self, client, file_message, new_filename, status_message, chat_id):
+    async def process_file(self, client, file_message, new_filename, status_message, chat_id, progress=None):
         """Process file with complete logging"""
         downloaded_path = None
         renamed_path = None
+        cached_id = None
+        capture = None
+        area = None
         original_file_info = None
+        progress = progress or TransferProgress(status_message)
+        progress_ticker.register(progress)
         
         try:
             # Get original file info for logging
             original_file_info = await self.get_file_info(file_message)
-            
-            # Step 1: Download file
-            download_result = await self.downloader.download_file(file_message, status_message)
-            
-            if not download_result['success']:
-                await self.log_activity(client, "DOWNLOAD_FAILED", original_file_info, download_result['error'])
-                return download_result
+            unique_id = original_file_info['file_unique_id'] if original_file_info else None
+            thumbnail = await self.resolve_thumbnail(original_file_info)
+            capture = self.video_capture(original_file_info, thumbnail)
+            on_chunk = capture.feed if capture else None
 
-            downloaded_path = download_result['file_path']
+            # Cache hits skip the download phase entirely
+            cached_path = file_cache.lookup(unique_id) if unique_id else None
+            if cached_path:
+                cached_id = unique_id
+                logger.info(f"Cache hit: {original_file_info['file_name']}")
+                if capture:
+                    await capture.feed_file(cached_path)
+            elif Config.STREAMING_MODE:
+                return await self.stream_file(client, file_message, new_filename, progress,
+                                              chat_id, original_file_info, thumbnail, capture)
+            else:
+                # Step 1: Download file into a private directory, once its size fits on disk
+                file_size = original_file_info['file_size'] if original_file_info else 0
+                try:
+                    area = await staging_manager.reserve(file_size or 0, progress, key=unique_id)
+                except StagingFull as e:
+                    self.log_activity(client, "DOWNLOAD_FAILED", original_file_info, str(e))
+                    return {'success': False, 'error': str(e)}
+                download_result = await self.downloader.download_file(file_message, progress, area, on_chunk)
+                
+                if not download_result['success']:
+                    self.log_activity(client, "DOWNLOAD_FAILED", original_file_info, download_result['error'])
+                    return download_result
 
-            # Step 2: Rename file
-            rename_result = await self.rename_file(downloaded_path, new_filename)
-            
-            if not rename_result['success']:
-                await self.cleanup_files(downloaded_path)
-                await self.log_activity(client, "RENAME_FAILED", original_file_info, rename_result['error'])
-                return rename_result
+                downloaded_path = download_result['file_path']
+                if unique_id:
+                    cached_path = file_cache.store(unique_id, downloaded_path)
+                    if cached_path:
+                        # The cache owns the file now, so its staging space is free again
+                        cached_id = unique_id
+                        downloaded_path = None
+                        area.release()
+
+            # Downloads feed the capture chunk by chunk; a resumed one skipped the head
+            if capture:
+                await capture.feed_file(cached_path or downloaded_path)
+            thumbnail = await self.image_thumbnail(original_file_info, thumbnail, cached_path or downloaded_path)
 
-            renamed_path = rename_result['file_path']
+            # Step 2: Rename file (cached files keep their name on disk and are renamed on upload)
+            if cached_path:
+                upload_path = cached_path
+                upload_name = target_file_name(original_file_info['file_name'], new_filename)
+            else:
+                rename_started = time.time()
+                rename_result = await self.rename_file(downloaded_path, new_filename)
+                metrics.phase_seconds.observe(time.time() - rename_started, 'rename')
+                
+                if not rename_result['success']:
+                    await self.cleanup_files(downloaded_path)
+                    self.log_activity(client, "RENAME_FAILED", original_file_info, rename_result['error'])
+                    return rename_result
 
-            # Step 3: Upload file
-            caption = f"**Renamed to:** `{os.path.basename(renamed_path)}`"
+                renamed_path = rename_result['file_path']
+                upload_path = renamed_path
+                upload_name = os.path.basename(renamed_path)
+
+            # Step 3: Upload file, with the video frame if extraction finishes in time
+            thumbnail = (capture and await capture.wait(Config.VIDEO_THUMB_WAIT)) or thumbnail
+            caption = f"**Renamed to:** `{upload_name}`"
             upload_result = await self.uploader.upload_file(
-                client, chat_id, renamed_path, status_message, caption
+                client, chat_id, upload_path, progress, caption,
+                file_name=upload_name, thumbnail=thumbnail
             )
 
             # Step 4: Log activity
             if upload_result['success']:
-                await self.log_success(client, original_file_info, upload_result, new_filename)
+                self.remember_upload(original_file_info, upload_name, thumbnail, upload_result)
+                self.log_success(client, original_file_info, upload_result, new_filename)
             else:
-                await self.log_activity(client, "UPLOAD_FAILED", original_file_info, upload_result['error'])
+                self.log_activity(client, "UPLOAD_FAILED", original_file_info, upload_result['error'])
 
             return upload_result
 
         except Exception as e:
             logger.error(f"Processing error: {e}")
-            await self.log_activity(client, "PROCESSING_ERROR", original_file_info, str(e))
+            self.log_activity(client, "PROCESSING_ERROR", original_file_info, str(e))
             return {'success': False, 'error': str(e)}
         finally:
+            # Stop status edits before the caller posts the final result
+            await progress_ticker.unregister(progress)
+            if capture:
+                capture.close()
+            if cached_id:
+                file_cache.release(cached_id)
             # Always cleanup temporary files
             await self.cleanup_files(downloaded_path, renamed_path)
+            if area:
+                area.release(discard=progress.cancelled)
+
+    async def stream_file(self, client, file_message, new_filename, progress, chat_id, file_info, thumbnail,
+                          capture=None):
+        """Process file without touching disk"""
+        file_name = target_file_name(file_info['file_name'] if file_info else 'file', new_filename)
+        caption = f"**Renamed to:** `{file_name}`"
+        chosen = {'thumbnail': thumbnail}
+
+        def thumb():
+            # Picked at commit time, when the video frame has usually been extracted
+            chosen['thumbnail'] = (capture and capture.result()) or thumbnail
+            return chosen['thumbnail'].as_file() if chosen['thumbnail'] else None
+
+        stream_result = await self.streamer.stream_file(
+            client, file_message, new_filename, progress, chat_id, caption,
+            thumb=thumb, on_chunk=capture.feed if capture else None
+        )
+
+        if stream_result['success']:
+            self.remember_upload(file_info, file_name, chosen['thumbnail'], stream_result)
+            self.log_success(client, file_info, stream_result, new_filename)
+        else:
+            self.log_activity(client, "UPLOAD_FAILED", file_info, stream_result['error'])
+
+        return stream_result
+
+    async def send_cached(self, client, file_message, new_filename, chat_id):
+        """Answer a repeat request with the previously uploaded file, skipping both transfers"""
+        file_info = await self.get_file_info(file_message)
+        if not file_info or not file_info['file_unique_id']:
+            return None
+
+        file_name = target_file_name(file_info['file_name'], new_filename)
+        thumbnail = await self.resolve_thumbnail(file_info)
+        thumb_key = thumbnail.key if thumbnail else None
+        file_id = upload_index.get(file_info['file_unique_id'], file_name, thumb_key)
+        if not file_id:
+            return None
+
+        try:
+            message = await client.send_cached_media(
+                chat_id=chat_id,
+                file_id=file_id,
+                caption=f"**Renamed to:** `{file_name}`"
+            )
+        except Exception as e:
+            logger.warning(f"Cached upload rejected, re-processing: {e}")
+            upload_index.discard(file_info['file_unique_id'], file_name, thumb_key)
+            return None
+
+        logger.info(f"Answered from upload index: {file_name}")
+        metrics.jobs.inc(1, 'cached')
+        return {'success': True, 'cached': True, 'message': message, 'file_name': file_name}
+
+    def remember_upload(self, file_info, file_name, thumbnail, upload_result):
+        """Index the uploaded document so the same request can be answered instantly"""
+        message = upload_result.get('message')
+        document = getattr(message, 'document', None) if message else None
+        if not file_info or not file_info['file_unique_id'] or not document:
+            return
+        upload_index.put(file_info['file_unique_id'], file_name, thumbnail.key if thumbnail else None,
+                         document.file_id)
+
+    async def resolve_thumbnail(self, file_info):
+        """The user's own thumbnail if set, then a cached video frame or image, otherwise the global one"""
+        user_id = file_info['user_id'] if file_info else None
+        if user_id:
+            thumbnail = await user_thumbnails.get(user_id)
+            if thumbnail:
+                return thumbnail
+        if Config.VIDEO_THUMBNAILS and is_video(file_info) and file_info['file_unique_id']:
+            thumbnail = video_thumbnailer.cached(file_info['file_unique_id'])
+            if thumbnail:
+                return thumbnail
+        if Config.IMAGE_THUMBNAILS and is_image(file_info) and file_info['file_unique_id']:
+            thumbnail = image_thumbnailer.cached(file_info['file_unique_id'])
+            if thumbnail:
+                return thumbnail
+        return self.uploader.thumbnail
+
+    async def image_thumbnail(self, file_info, thumbnail, path):
+        """The image itself for image documents that would otherwise get the global thumbnail"""
+        if not Config.IMAGE_THUMBNAILS or thumbnail is not self.uploader.thumbnail:
+            return thumbnail
+        if not is_image(file_info) or not file_info['file_unique_id']:
+            return thumbnail
+        return await image_thumbnailer.render(file_info['file_unique_id'], path) or thumbnail
+
+    def video_capture(self, file_info, thumbnail):
+        """Head capture for videos that would otherwise get the global thumbnail"""
+        if not Config.VIDEO_THUMBNAILS or thumbnail is not self.uploader.thumbnail:
+            return None
+        if not is_video(file_info) or not file_info['file_unique_id']:
+            return None
+        return video_thumbnailer.capture(file_info['file_unique_id'], file_info['file_size'] or 0)
 
     async def get_file_info(self, message):
         """Extract file information for logging"""
@@ -78,76 +242,48 @@ class TurboFileProcessor:
             'file_name': getattr(file_obj, 'file_name', 'Unknown'),
             'file_size': getattr(file_obj, 'file_size', 0),
             'mime_type': getattr(file_obj, 'mime_type', 'Unknown'),
+            'file_unique_id': getattr(file_obj, 'file_unique_id', None),
             'user_id': message.from_user.id if message.from_user else None,
             'username': message.from_user.username if message.from_user else None,
             'message_id': message.id,
             'chat_id': message.chat.id
         }
 
-    async def log_success(self, client, file_info, upload_result, new_filename):
-        """Log successful file processing"""
-        if not Config.LOG_CHANNEL:
+    def log_success(self, client, file_info, upload_result, new_filename):
+        """Queue a successful rename for the log-channel digest"""
+        if not Config.LOG_CHANNEL or not file_info:
             return
-            
-        try:
-            user_info = f"@{file_info['username']}" if file_info['username'] else f"User ID: {file_info['user_id']}"
-            
-            log_message = (
-                f"✅ **File Processing Successful**\n\n"
-                f"**User:** {user_info}\n"
-                f"**Original File:** `{file_info['file_name']}`\n"
-                f"**Renamed To:** `{new_filename}`\n"
-                f"**File Size:** {self.format_bytes(file_info['file_size'])}\n"
-                f"**Upload Time:** {upload_result['upload_time']:.1f}s\n"
-                f"**Upload Speed:** {self.format_bytes(upload_result['speed'])}/s\n"
-                f"**Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            )
-            
-            await client.send_message(
-                chat_id=Config.LOG_CHANNEL,
-                text=log_message
-            )
-            
-            # Also forward the original message if possible
-            try:
-                await client.forward_messages(
-                    chat_id=Config.LOG_CHANNEL,
-                    from_chat_id=file_info['chat_id'],
-                    message_ids=file_info['message_id']
-                )
-            except Exception as e:
-                logger.warning(f"Could not forward message to log channel: {e}")
-                
-        except Exception as e:
-            logger.error(f"Failed to log success: {e}")
 
-    async def log_activity(self, client, activity_type, file_info, error_message=None):
-        """Log various activities"""
+        user_info = f"@{file_info['username']}" if file_info['username'] else f"User ID: {file_info['user_id']}"
+        log_pipeline.emit(client, LogEvent(
+            PRIORITY_SUCCESS,
+            f"✅ {user_info} • `{file_info['file_name']}` → `{new_filename}`\n"
+            f"{self.format_bytes(file_info['file_size'])} in {upload_result['upload_time']:.1f}s "
+            f"({self.format_bytes(upload_result['speed'])}/s) • {datetime.now().strftime('%H:%M:%S')}"
+        ))
+        # Also forward the original message; dropped first when the queue is full
+        log_pipeline.emit(client, LogEvent(
+            PRIORITY_FORWARD, forward_from=file_info['chat_id'], message_id=file_info['message_id']
+        ))
+
+    def log_activity(self, client, activity_type, file_info, error_message=None):
+        """Queue a failure for the log-channel digest"""
         if not Config.LOG_CHANNEL:
             return
-            
-        try:
-            user_info = f"@{file_info['username']}" if file_info and file_info['username'] else f"User ID: {file_info['user_id']}" if file_info else "Unknown User"
-            file_name = file_info['file_name'] if file_info else "Unknown File"
-            
-            if activity_type == "DOWNLOAD_FAILED":
-                log_text = f"❌ **Download Failed**\n\nUser: {user_info}\nFile: `{file_name}`\nError: {error_message}"
-            elif activity_type == "UPLOAD_FAILED":
-                log_text = f"❌ **Upload Failed**\n\nUser: {user_info}\nFile: `{file_name}`\nError: {error_message}"
-            elif activity_type == "RENAME_FAILED":
-                log_text = f"❌ **Rename Failed**\n\nUser: {user_info}\nFile: `{file_name}`\nError: {error_message}"
-            else:
-                log_text = f"⚠️ **Processing Error**\n\nUser: {user_info}\nError: {error_message}"
-            
-            log_text += f"\n**Time:** {datetime.now().strftime('%H:%M:%S')}"
-            
-            await client.send_message(
-                chat_id=Config.LOG_CHANNEL,
-                text=log_text
-            )
-            
-        except Exception as e:
-            logger.error(f"Failed to log activity: {e}")
+
+        user_info = f"@{file_info['username']}" if file_info and file_info['username'] else f"User ID: {file_info['user_id']}" if file_info else "Unknown User"
+        file_name = file_info['file_name'] if file_info else "Unknown File"
+
+        titles = {
+            "DOWNLOAD_FAILED": "❌ **Download Failed**",
+            "UPLOAD_FAILED": "❌ **Upload Failed**",
+            "RENAME_FAILED": "❌ **Rename Failed**",
+        }
+        title = titles.get(activity_type, "⚠️ **Processing Error**")
+        log_pipeline.emit(client, LogEvent(
+            PRIORITY_FAILURE,
+            f"{title} • {user_info} • `{file_name}`\nError: {error_message} • {datetime.now().strftime('%H:%M:%S')}"
+        ))
 
     async def rename_file(self, file_path, new_name):
         """Rename file with extension preservation"""
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import signal
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from PIL import Image, ImageOps
+from thumbnail_registry import ThumbnailEntry, encode_thumbnail
+import logging
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MIME_TYPES = ('image/jpeg', 'image/png', 'image/webp')
+
+
+class CpuLimitExceeded(Exception):
+    """Raised inside a worker when a job uses up its CPU time"""
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuLimitExceeded()
+
+
+def init_worker():
+    if resource:
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+
+def cpu_capped(func, *args):
+    """Run func in this worker with a soft CPU limit of IMAGE_THUMB_CPU_SECONDS"""
+    if not resource:
+        return func(*args)
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # RLIMIT_CPU counts the whole process, so the cap is set relative to what was used so far
+    limit = int(usage.ru_utime + usage.ru_stime) + Config.IMAGE_THUMB_CPU_SECONDS
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+    try:
+        return func(*args)
+    except CpuLimitExceeded:
+        return None
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def render_image_thumbnail(path):
+    """Thumbnail an image document, decoding as little of it as possible (runs in a worker process)"""
+    with Image.open(path) as img:
+        if img.format == 'JPEG':
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale straight from the DCT data
+            img.draft('RGB', Config.THUMBNAIL_SIZE)
+        # Only the header has been read so far; refuse what would need a huge full decode
+        if img.size[0] * img.size[1] > Config.IMAGE_THUMB_MAX_PIXELS:
+            return None
+        img = ImageOps.exif_transpose(img)
+        return encode_thumbnail(img)
+
+
+class ImageThumbnailer:
+    """Thumbnails for JPEG/PNG/WebP documents, cached by file_unique_id"""
+
+    def __init__(self):
+        self.cache = OrderedDict()  # unique_id -> ThumbnailEntry, least recently used first
+        self.pool = None
+
+    def cached(self, unique_id):
+        entry = self.cache.get(unique_id)
+        if entry:
+            self.cache.move_to_end(unique_id)
+        return entry
+
+    async def render(self, unique_id, path):
+        """Render a thumbnail for an image on disk in the worker pool and cache it"""
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=Config.IMAGE_THUMB_WORKERS, initializer=init_worker)
+
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(self.pool, cpu_capped, render_image_thumbnail, path)
+        except Exception as e:
+            logger.warning(f"Image thumbnail failed: {e}")
+            return None
+        if not data:
+            logger.info(f"Image thumbnail skipped (too large or over CPU cap): {path}")
+            return None
+
+        entry = ThumbnailEntry(hashlib.sha256(data).hexdigest()[:16], data, "image")
+        self.cache[unique_id] = entry
+        while len(self.cache) > Config.IMAGE_THUMB_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return entry
+
+
+def is_image(file_info):
+    return bool(file_info) and str(file_info.get('mime_type') or '').lower() in IMAGE_MIME_TYPES
+
+
+# Process-wide image thumbnailer
+image_thumbnailer = ImageThumbnailer()
@@ -0,0 +1,204 @@
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from aiohttp import web
+from config import Config
+from job_manager import Job, job_manager
+from job_scheduler import job_scheduler
+from progress_ticker import TransferProgress
+from rate_limiter import rate_limiter
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JobAPI:
+    """HTTP job submission with long-poll and Server-Sent Events progress
+
+    API jobs run under the API_USER_ID scheduler identity. They are
+    capped at API_MAX_JOBS running at once instead of MAX_JOBS_PER_USER,
+    and still take turns with Telegram users for the shared slots.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.file_processor = None
+        self.jobs = {}  # job_id -> {'job', 'state', 'result'}
+        self.finished = OrderedDict()  # job_id -> record, in the order jobs finished
+
+    def setup(self, app: web.Application):
+        app.router.add_post('/jobs', self.submit)
+        app.router.add_post('/webhook', self.submit)
+        app.router.add_get('/jobs/{job_id}', self.status)
+        app.router.add_get('/jobs/{job_id}/events', self.events)
+
+    def attach(self, client, file_processor):
+        """Give the API the running bot client and processor"""
+        self.client = client
+        self.file_processor = file_processor
+
+    def authorized(self, request):
+        return bool(Config.API_TOKEN) and request.headers.get('Authorization') == f"Bearer {Config.API_TOKEN}"
+
+    async def submit(self, request):
+        """POST {chat_id, message_id, new_name[, target_chat_id]} -> {job_id}"""
+        if not self.authorized(request):
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+        if not self.client:
+            return web.json_response({'error': 'Bot not running'}, status=503)
+
+        try:
+            data = await request.json()
+            chat_id = int(data['chat_id'])
+            message_id = int(data['message_id'])
+            new_name = str(data['new_name']).strip()
+            target_chat_id = int(data.get('target_chat_id', chat_id))
+        except (ValueError, KeyError, TypeError):
+            return web.json_response({'error': 'chat_id, message_id and new_name are required'}, status=400)
+        if not new_name or len(new_name) > 100 or any(char in new_name for char in '<>:"/\\|?*'):
+            return web.json_response({'error': 'Invalid new_name'}, status=400)
+
+        try:
+            file_msg = await self.client.get_messages(chat_id, message_id)
+        except Exception as e:
+            return web.json_response({'error': f'Could not fetch message: {e}'}, status=400)
+        file_obj = file_msg and not file_msg.empty and (file_msg.document or file_msg.video or file_msg.audio)
+        if not file_obj:
+            return web.json_response({'error': 'Message has no file'}, status=404)
+
+        file_name = getattr(file_obj, 'file_name', None) or 'file'
+        file_size = getattr(file_obj, 'file_size', 0)
+        allowed, reason, retry_after = rate_limiter.reserve_global_bytes(file_size)
+        if not allowed:
+            return web.json_response(
+                {'error': f'Rate limit reached: {reason}'}, status=429,
+                headers={'Retry-After': str(int(retry_after or Config.RATE_LIMIT_WINDOW))}
+            )
+
+        progress = TransferProgress(None, file_name)
+        job = Job(Config.API_USER_ID, target_chat_id, file_name, file_size, progress)
+        record = self.remember(job)
+        job_manager.submit(job, self.run(record, file_msg, new_name, target_chat_id))
+        return web.json_response({'job_id': job.id, 'status_url': f"/jobs/{job.id}"}, status=202)
+
+    async def run(self, record, file_msg, new_name, chat_id):
+        job = record['job']
+        try:
+            result = await self.file_processor.send_cached(self.client, file_msg, new_name, chat_id)
+            if not result:
+                result = await job_scheduler.run(
+                    job.user_id, job.file_size,
+                    lambda: self.file_processor.process_file(
+                        client=self.client,
+                        file_message=file_msg,
+                        new_filename=new_name,
+                        status_message=None,
+                        chat_id=chat_id,
+                        progress=job.progress
+                    ),
+                    job.progress
+                )
+            record['result'] = result
+            record['state'] = 'done' if result['success'] else 'failed'
+            return result
+        except asyncio.CancelledError:
+            record['state'] = 'cancelled'
+            raise
+        except Exception as e:
+            logger.error(f"API job {job.id} failed: {e}")
+            record['result'] = {'success': False, 'error': str(e)}
+            record['state'] = 'failed'
+            return record['result']
+        finally:
+            record['finished_at'] = time.time()
+            self.retire(job.id, record)
+
+    def remember(self, job):
+        record = {'job': job, 'state': 'running', 'result': None, 'finished_at': None}
+        self.jobs[job.id] = record
+        return record
+
+    def retire(self, job_id, record):
+        """Move a finished job into the history; the earliest finished drop out past API_JOB_HISTORY"""
+        self.finished[job_id] = record
+        while len(self.finished) > Config.API_JOB_HISTORY:
+            oldest_id, _ = self.finished.popitem(last=False)
+            self.jobs.pop(oldest_id, None)
+
+    async def status(self, request):
+        """Job state; with ?wait=N, long-poll until it differs from ?since=<version>"""
+        if not self.authorized(request):
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+        record = self.jobs.get(request.match_info['job_id'])
+        if not record:
+            return web.json_response({'error': 'No such job'}, status=404)
+
+        snapshot = job_snapshot(record)
+        try:
+            wait = min(float(request.query.get('wait', 0)), Config.API_LONG_POLL_MAX)
+        except ValueError:
+            wait = 0
+        since = request.query.get('since')
+        deadline = time.monotonic() + wait
+        while since == snapshot['version'] and not snapshot['finished'] and time.monotonic() < deadline:
+            await asyncio.sleep(Config.API_PROGRESS_INTERVAL)
+            snapshot = job_snapshot(record)
+        return web.json_response(snapshot)
+
+    async def events(self, request):
+        """Server-Sent Events stream of job snapshots until the job ends"""
+        if not self.authorized(request):
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+        record = self.jobs.get(request.match_info['job_id'])
+        if not record:
+            return web.json_response({'error': 'No such job'}, status=404)
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+        await response.prepare(request)
+
+        last_version = None
+        while True:
+            snapshot = job_snapshot(record)
+            if snapshot['version'] != last_version:
+                last_version = snapshot['version']
+                event = 'end' if snapshot['finished'] else 'progress'
+                await response.write(f"event: {event}\ndata: {json.dumps(snapshot)}\n\n".encode())
+            if snapshot['finished']:
+                break
+            await asyncio.sleep(Config.API_PROGRESS_INTERVAL)
+        return response
+
+
+def job_snapshot(record):
+    """Progress of an API job, read from the same counters as the status messages"""
+    job, progress, result = record['job'], record['job'].progress, record['result']
+    elapsed = time.time() - progress.phase_started_at
+    snapshot = {
+        'job_id': job.id,
+        'state': record['state'],
+        'finished': record['finished_at'] is not None,
+        'phase': progress.phase,
+        'file_name': progress.file_name,
+        'current': progress.current,
+        'total': progress.total,
+        'percent': round(min(progress.current / progress.total * 100, 100), 1) if progress.total else 0,
+        'speed': round(progress.current / elapsed) if elapsed > 0 else 0,
+        'details': {label: str(value) for label, value in progress.details.items()},
+    }
+    if result:
+        message = result.get('message')
+        snapshot['error'] = result.get('error')
+        snapshot['result_file_name'] = result.get('file_name')
+        snapshot['result_message_id'] = getattr(message, 'id', None)
+    # Changes whenever anything a client would display changes
+    snapshot['version'] = f"{snapshot['state']}:{snapshot['phase']}:{snapshot['current']}:{len(snapshot['details'])}"
+    return snapshot
+
+
+# Process-wide job API, mounted on the web server
+job_api = JobAPI()
@@ -0,0 +1,99 @@
+import time
+import uuid
+import asyncio
+from progress_ticker import TransferProgress
+from state_store import state_store
+from metrics import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A rename job running in the background"""
+
+    def __init__(self, user_id, chat_id, file_name, file_size, progress: TransferProgress):
+        self.id = uuid.uuid4().hex[:8]
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.file_name = file_name
+        self.file_size = file_size
+        self.progress = progress
+        self.started_at = time.time()
+        self.task = None
+
+    @property
+    def phase(self):
+        return self.progress.phase
+
+    @property
+    def bytes_done(self):
+        return self.progress.current
+
+    @property
+    def bytes_total(self):
+        return self.progress.total or self.file_size
+
+
+class JobManager:
+    """Registry of background rename jobs, independent of dispatcher workers"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def submit(self, job: Job, coro):
+        """Run a job coroutine in the background and track it until it ends"""
+        self.jobs[job.id] = job
+        state_store.save_job(job, 'running')
+
+        async def runner():
+            try:
+                result = await coro
+                if isinstance(result, dict) and not result.get('success', True):
+                    state_store.save_job(job, 'failed', result.get('error'))
+                    metrics.jobs.inc(1, 'failed')
+                else:
+                    state_store.save_job(job, 'done')
+                    # send_cached already counted answers from the upload index
+                    if not (isinstance(result, dict) and result.get('cached')):
+                        metrics.jobs.inc(1, 'done')
+                return result
+            except asyncio.CancelledError:
+                logger.info(f"Job {job.id} cancelled")
+                state_store.save_job(job, 'cancelled')
+                metrics.jobs.inc(1, 'cancelled')
+                raise
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {e}")
+                state_store.save_job(job, 'failed', str(e))
+                metrics.jobs.inc(1, 'failed')
+            finally:
+                self.jobs.pop(job.id, None)
+
+        job.task = asyncio.ensure_future(runner())
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def user_jobs(self, user_id):
+        """Active jobs of one user, oldest first"""
+        return sorted(
+            (job for job in self.jobs.values() if job.user_id == user_id),
+            key=lambda job: job.started_at
+        )
+
+    def cancel(self, job_id, user_id=None):
+        """Abort a job; returns False when it does not exist or belongs to someone else"""
+        job = self.jobs.get(job_id)
+        if not job or (user_id is not None and job.user_id != user_id):
+            return False
+        if job.task and not job.task.done():
+            job.progress.cancelled = True
+            job.task.cancel()
+        return True
+
+
+# Process-wide job registry
+job_manager = JobManager()
+metrics.gauge("renamer_active_jobs", "Jobs queued or running", lambda: len(job_manager.jobs))
@@ -0,0 +1,179 @@
+import time
+import asyncio
+from collections import OrderedDict, deque
+from config import Config
+from progress_ticker import TransferProgress, progress_ticker, format_time
+from metrics import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Ticket:
+    """A job waiting for (or holding) a scheduler slot"""
+
+    def __init__(self, user_id, file_size, progress):
+        self.user_id = user_id
+        self.file_size = file_size
+        self.progress = progress
+        self.started = asyncio.Event()
+        self.lane = None
+
+
+class _Lane:
+    """Round-robin per-user queues sharing a fixed number of slots"""
+
+    def __init__(self, name, slots):
+        self.name = name
+        self.slots = slots
+        self.active = 0
+        self.queues = OrderedDict()  # user_id -> deque of tickets, in rotation order
+        self.avg_job_time = 0.0
+
+    def push(self, ticket):
+        self.queues.setdefault(ticket.user_id, deque()).append(ticket)
+
+    def remove(self, ticket):
+        queue = self.queues.get(ticket.user_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self.queues[ticket.user_id]
+
+    def pop_next(self, user_active):
+        """Take the next ticket, skipping users at their concurrency cap"""
+        for user_id in list(self.queues):
+            if user_active.get(user_id, 0) >= user_job_limit(user_id):
+                continue
+            queue = self.queues.pop(user_id)
+            ticket = queue.popleft()
+            if queue:
+                # Back of the rotation
+                self.queues[user_id] = queue
+            return ticket
+        return None
+
+    def position(self, ticket):
+        """1-based position of a ticket in the round-robin order"""
+        users = list(self.queues)
+        depth = self.queues[ticket.user_id].index(ticket)
+        rank = users.index(ticket.user_id)
+        ahead = 0
+        for index, user_id in enumerate(users):
+            length = len(self.queues[user_id])
+            ahead += min(length, depth)
+            if index < rank and length > depth:
+                ahead += 1
+        return ahead + 1
+
+    def record(self, duration):
+        """Track the average job time for start estimates"""
+        if self.avg_job_time:
+            self.avg_job_time = 0.8 * self.avg_job_time + 0.2 * duration
+        else:
+            self.avg_job_time = duration
+
+
+def user_job_limit(user_id):
+    """Running jobs a user may hold; bulk API jobs share one identity with its own cap"""
+    return Config.API_MAX_JOBS if user_id == Config.API_USER_ID else Config.MAX_JOBS_PER_USER
+
+
+class JobScheduler:
+    """Global concurrency cap with per-user round-robin and a small-file fast lane"""
+
+    def __init__(self):
+        self.main_lane = _Lane('main', Config.MAX_ACTIVE_JOBS)
+        self.fast_lane = _Lane('fast', Config.FAST_LANE_SLOTS)
+        self.user_active = {}
+
+    async def run(self, user_id, file_size, job_factory, progress: TransferProgress = None):
+        """Wait for a slot, then run the job"""
+        ticket = _Ticket(user_id, file_size, progress)
+        queued_at = time.time()
+        lane = self.fast_lane if file_size <= Config.SMALL_FILE_SIZE else self.main_lane
+        lane.push(ticket)
+        self.dispatch()
+
+        if not ticket.started.is_set():
+            if progress:
+                progress.set_phase('QUEUED')
+                progress_ticker.register(progress)
+            self.report_positions()
+            try:
+                await ticket.started.wait()
+            except asyncio.CancelledError:
+                lane.remove(ticket)
+                if ticket.started.is_set():
+                    self.release(ticket, 0)
+                if progress:
+                    await progress_ticker.unregister(progress)
+                self.report_positions()
+                raise
+
+        started_at = time.time()
+        metrics.phase_seconds.observe(started_at - queued_at, 'queue')
+        try:
+            return await job_factory()
+        finally:
+            self.release(ticket, time.time() - started_at)
+
+    def dispatch(self):
+        """Start queued jobs while slots are free"""
+        for lane in (self.fast_lane, self.main_lane):
+            while lane.active < lane.slots:
+                ticket = lane.pop_next(self.user_active)
+                if not ticket:
+                    break
+                self.start(ticket, lane)
+
+        # Small files may also borrow idle main slots
+        while self.main_lane.active < self.main_lane.slots:
+            ticket = self.fast_lane.pop_next(self.user_active)
+            if not ticket:
+                break
+            self.start(ticket, self.main_lane)
+
+    def start(self, ticket, lane):
+        lane.active += 1
+        ticket.lane = lane
+        self.user_active[ticket.user_id] = self.user_active.get(ticket.user_id, 0) + 1
+        if ticket.progress:
+            ticket.progress.details.pop('Queue Position', None)
+            ticket.progress.details.pop('Estimated Start', None)
+        ticket.started.set()
+
+    def release(self, ticket, duration):
+        """Free a slot and hand it to the next queued job"""
+        lane = ticket.lane
+        lane.active -= 1
+        if duration:
+            lane.record(duration)
+        remaining = self.user_active.get(ticket.user_id, 1) - 1
+        if remaining:
+            self.user_active[ticket.user_id] = remaining
+        else:
+            self.user_active.pop(ticket.user_id, None)
+        self.dispatch()
+        self.report_positions()
+
+    def report_positions(self):
+        """Refresh queue position and start estimate of every waiting job"""
+        for lane in (self.fast_lane, self.main_lane):
+            for queue in lane.queues.values():
+                for ticket in queue:
+                    if not ticket.progress:
+                        continue
+                    position = lane.position(ticket)
+                    ticket.progress.details['Queue Position'] = f"#{position}"
+                    if lane.avg_job_time:
+                        rounds = (position - 1) // max(lane.slots, 1) + 1
+                        ticket.progress.details['Estimated Start'] = f"~{format_time(rounds * lane.avg_job_time)}"
+
+
+# Process-wide scheduler in front of TurboFileProcessor
+job_scheduler = JobScheduler()
+metrics.gauge(
+    "renamer_queued_jobs", "Jobs waiting for a slot",
+    lambda: sum(len(q) for lane in (job_scheduler.fast_lane, job_scheduler.main_lane) for q in lane.queues.values())
+)
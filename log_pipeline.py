@@ -0,0 +1,145 @@
+import time
+import asyncio
+from collections import deque
+from datetime import datetime
+from pyrogram.errors import FloodWait
+from config import Config
+from metrics import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Event priorities; when the queue is full the lowest ones are dropped first
+PRIORITY_FORWARD = 0
+PRIORITY_SUCCESS = 1
+PRIORITY_FAILURE = 2
+
+MAX_MESSAGE_LENGTH = 4000
+MAX_FORWARD_IDS = 100  # Telegram's limit per forwardMessages call
+
+
+class LogEvent:
+    """One log-channel line, or an original message to forward"""
+
+    __slots__ = ('priority', 'text', 'forward_from', 'message_id', 'created_at')
+
+    def __init__(self, priority, text=None, forward_from=None, message_id=None):
+        self.priority = priority
+        self.text = text
+        self.forward_from = forward_from
+        self.message_id = message_id
+        self.created_at = time.time()
+
+
+class LogPipeline:
+    """Bounded background queue that posts log events as periodic digests"""
+
+    def __init__(self, max_events=None):
+        self.max_events = max_events or Config.LOG_QUEUE_SIZE
+        self.queues = {priority: deque() for priority in (PRIORITY_FORWARD, PRIORITY_SUCCESS, PRIORITY_FAILURE)}
+        self.size = 0
+        self.dropped = 0
+        self.client = None
+        self.task = None
+
+    def emit(self, client, event: LogEvent):
+        """Queue an event without waiting; saturation drops the least valuable events"""
+        if not Config.LOG_CHANNEL:
+            return
+        self.client = client
+        if self.size >= self.max_events and not self.make_room(event.priority):
+            self.dropped += 1
+            return
+        self.queues[event.priority].append(event)
+        self.size += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+
+    def make_room(self, priority):
+        """Drop the oldest event of a lower priority than the new one"""
+        for lower in sorted(self.queues):
+            if lower >= priority:
+                break
+            if self.queues[lower]:
+                self.queues[lower].popleft()
+                self.size -= 1
+                self.dropped += 1
+                return True
+        return False
+
+    async def run(self):
+        """Post one digest every LOG_DIGEST_INTERVAL seconds while events arrive"""
+        while self.size:
+            await asyncio.sleep(Config.LOG_DIGEST_INTERVAL)
+            await self.flush()
+
+    async def stop(self):
+        """Post whatever is still queued"""
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        await self.flush()
+
+    async def flush(self):
+        events = sorted(
+            (event for queue in self.queues.values() for event in queue),
+            key=lambda event: event.created_at
+        )
+        for queue in self.queues.values():
+            queue.clear()
+        self.size = 0
+        dropped, self.dropped = self.dropped, 0
+        if not events or not self.client:
+            return
+        started_at = time.time()
+
+        lines = [event.text for event in events if event.text]
+        if dropped:
+            lines.append(f"⚠️ {dropped} log events dropped under load")
+        for text in digest_messages(lines):
+            await self.send(self.client.send_message, chat_id=Config.LOG_CHANNEL, text=text)
+
+        # Originals are forwarded in as few calls per source chat as Telegram allows
+        forwards = {}
+        for event in events:
+            if event.forward_from is not None:
+                forwards.setdefault(event.forward_from, []).append(event.message_id)
+        for chat_id, message_ids in forwards.items():
+            for start in range(0, len(message_ids), MAX_FORWARD_IDS):
+                await self.send(
+                    self.client.forward_messages,
+                    chat_id=Config.LOG_CHANNEL, from_chat_id=chat_id,
+                    message_ids=message_ids[start:start + MAX_FORWARD_IDS]
+                )
+        metrics.phase_seconds.observe(time.time() - started_at, 'log')
+
+    async def send(self, method, **kwargs):
+        """Call a send method, waiting out one flood wait"""
+        for _ in range(2):
+            try:
+                return await method(**kwargs)
+            except FloodWait as e:
+                metrics.flood_waits.inc(1, 'log')
+                logger.info(f"Log channel flood wait: {e.value}s")
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                logger.warning(f"Log channel send failed: {e}")
+                return None
+
+
+def digest_messages(lines):
+    """Pack digest lines into as few messages as possible"""
+    header = f"📊 **Activity Digest** • {datetime.now().strftime('%H:%M:%S')}\n\n"
+    messages, current = [], header
+    for line in lines:
+        if len(current) + len(line) + 2 > MAX_MESSAGE_LENGTH and current != header:
+            messages.append(current.rstrip())
+            current = header
+        current += line[:MAX_MESSAGE_LENGTH - len(header)] + "\n\n"
+    if current != header:
+        messages.append(current.rstrip())
+    return messages
+
+
+# Process-wide log-channel pipeline
+log_pipeline = LogPipeline()
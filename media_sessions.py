@@ -0,0 +1,73 @@
+import asyncio
+from pyrogram import raw
+from pyrogram.session import Session, Auth
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MediaSessionPool:
+    """Pool of dedicated media connections to one Telegram data center"""
+
+    def __init__(self, client, dc_id=None, size=1):
+        self.client = client
+        self.dc_id = dc_id
+        self.size = max(1, size)
+        self.sessions = []
+
+    async def start(self):
+        """Open all connections of the pool"""
+        client = self.client
+        home_dc = await client.storage.dc_id()
+        test_mode = await client.storage.test_mode()
+        dc_id = self.dc_id or home_dc
+        self.dc_id = dc_id
+
+        if dc_id == home_dc:
+            auth_key = await client.storage.auth_key()
+        else:
+            auth_key = await Auth(client, dc_id, test_mode).create()
+
+        sessions = [
+            Session(client, dc_id, auth_key, test_mode, is_media=True)
+            for _ in range(self.size)
+        ]
+        try:
+            await asyncio.gather(*(session.start() for session in sessions))
+
+            if dc_id != home_dc:
+                # All connections share one key, so one import authorizes them all
+                exported_auth = await client.invoke(
+                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
+                )
+                await sessions[0].invoke(
+                    raw.functions.auth.ImportAuthorization(
+                        id=exported_auth.id,
+                        bytes=exported_auth.bytes
+                    )
+                )
+        except Exception:
+            await asyncio.gather(*(session.stop() for session in sessions), return_exceptions=True)
+            raise
+
+        self.sessions = sessions
+        logger.debug(f"Media pool ready: DC{dc_id} x{len(sessions)}")
+        return self
+
+    async def stop(self):
+        """Close all connections of the pool"""
+        sessions, self.sessions = self.sessions, []
+        results = await asyncio.gather(*(session.stop() for session in sessions), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Media session stop failed: {result}")
+
+    def session_for(self, worker_index):
+        """Spread workers evenly over the pool connections"""
+        return self.sessions[worker_index % len(self.sessions)]
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
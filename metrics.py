@@ -0,0 +1,165 @@
+import time
+from bisect import bisect_left
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds; transfers of multi-GB files can take many minutes
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# Bytes per second
+THROUGHPUT_BUCKETS = tuple(2 ** n * 1024 * 1024 // 8 for n in range(12))  # 128KB/s .. 256MB/s
+
+
+class Counter:
+    """Monotonic counter per label value
+
+    All updates happen on the event loop thread, so plain integer
+    increments need no locking.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.values = {}
+
+    def inc(self, amount=1, label_value=None):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def samples(self):
+        for label_value, value in self.values.items():
+            yield self.name, self.labels(label_value), value
+
+    def labels(self, label_value, extra=None):
+        pairs = []
+        if self.label and label_value is not None:
+            pairs.append(f'{self.label}="{label_value}"')
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Gauge(Counter):
+    """Value that goes up and down, or is read from a function at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, label=None, function=None):
+        super().__init__(name, help_text, label)
+        self.function = function
+
+    def set(self, value, label_value=None):
+        self.values[label_value] = value
+
+    def dec(self, amount=1, label_value=None):
+        self.inc(-amount, label_value)
+
+    def samples(self):
+        if self.function:
+            try:
+                yield self.name, "", self.function()
+            except Exception as e:
+                logger.debug(f"Gauge {self.name} failed: {e}")
+            return
+        yield from super().samples()
+
+
+class Histogram(Counter):
+    """Fixed-bucket histogram per label value"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, label=None):
+        super().__init__(name, help_text, label)
+        self.buckets = buckets
+        self.values = {}  # label value -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, label_value=None):
+        series = self.values.get(label_value)
+        if series is None:
+            series = self.values[label_value] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for label_value, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                yield f"{self.name}_bucket", self.labels(label_value, f'le="{bound}"'), cumulative
+            yield f"{self.name}_sum", self.labels(label_value), series[-1]
+            yield f"{self.name}_count", self.labels(label_value), cumulative
+
+
+class Metrics:
+    """Process-wide instruments, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.instruments = []
+
+        self.phase_seconds = self.add(Histogram(
+            "renamer_phase_seconds", "Time spent per job phase", LATENCY_BUCKETS, label="phase"))
+        self.throughput = self.add(Histogram(
+            "renamer_throughput_bytes_per_second", "Transfer speed per completed transfer",
+            THROUGHPUT_BUCKETS, label="direction"))
+        self.transferred_bytes = self.add(Counter(
+            "renamer_transferred_bytes_total", "Bytes moved to or from Telegram", label="direction"))
+        self.jobs = self.add(Counter("renamer_jobs_total", "Finished jobs by result", label="result"))
+        self.flood_waits = self.add(Counter("renamer_flood_waits_total", "FloodWait errors seen", label="source"))
+        self.transfer_retries = self.add(Counter(
+            "renamer_transfer_retries_total", "Transfer attempts retried", label="reason"))
+        self.transfer_window = self.add(Gauge(
+            "renamer_transfer_window", "Parts in flight at the end of the last transfer", label="link"))
+        self.transfer_part_bytes = self.add(Gauge(
+            "renamer_transfer_part_bytes", "Part size the next transfer starts with", label="link"))
+        self.in_flight_bytes = self.add(Gauge("renamer_in_flight_bytes", "Size of files currently transferring"))
+        self.uptime = self.add(Gauge(
+            "renamer_uptime_seconds", "Seconds since start", function=lambda: time.time() - self.started_at))
+
+    def add(self, instrument):
+        self.instruments.append(instrument)
+        return instrument
+
+    def gauge(self, name, help_text, function):
+        """Register a gauge read from live state at scrape time"""
+        return self.add(Gauge(name, help_text, function=function))
+
+    def observe_transfer(self, direction, seconds, size):
+        """Record a completed download, upload or stream"""
+        self.phase_seconds.observe(seconds, direction)
+        self.transferred_bytes.inc(size, direction)
+        if seconds > 0:
+            self.throughput.observe(size / seconds, direction)
+
+    def snapshot(self):
+        """Headline numbers for the JSON /stats endpoint"""
+        stats = {
+            'uptime': round(time.time() - self.started_at),
+            'jobs': dict(self.jobs.values),
+            'files_processed': self.jobs.values.get('done', 0) + self.jobs.values.get('cached', 0),
+            'transferred_bytes': dict(self.transferred_bytes.values),
+            'in_flight_bytes': self.in_flight_bytes.values.get(None, 0),
+            'flood_waits': sum(self.flood_waits.values.values()),
+            'transfer_retries': dict(self.transfer_retries.values),
+        }
+        for instrument in self.instruments:
+            if getattr(instrument, 'function', None) and instrument is not self.uptime:
+                for name, _, value in instrument.samples():
+                    stats[name.replace('renamer_', '')] = value
+        return stats
+
+    def render(self):
+        lines = []
+        for instrument in self.instruments:
+            lines.append(f"# HELP {instrument.name} {instrument.help}")
+            lines.append(f"# TYPE {instrument.name} {instrument.kind}")
+            for name, labels, value in instrument.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide metrics registry
+metrics = Metrics()
@@ -0,0 +1,227 @@
+import os
+import json
+import math
+import time
+import asyncio
+from pyrogram import raw
+from pyrogram.file_id import FileId
+from config import Config
+from media_sessions import MediaSessionPool
+from chunk_tuner import chunk_tuner, valid_part_size, DOWNLOAD_PART_LIMITS
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CdnRedirect(Exception):
+    """Raised when Telegram serves the file from a CDN data center"""
+
+
+class DownloadJournal:
+    """Completed chunks of a partial download, persisted next to the file
+
+    Only chunks that were synced to disk before the journal was written are
+    recorded, so everything in a journal is safe to skip on resume.
+    """
+
+    def __init__(self, file_path, file_size, unique_id):
+        self.path = journal_path(file_path)
+        self.file_size = file_size
+        self.unique_id = unique_id
+        self.chunk_size = None  # set by the journal being resumed, else by the downloader
+        self.done = set()  # chunk indexes written to the file
+
+    @classmethod
+    def load(cls, file_path, file_size, unique_id):
+        """The journal of an earlier attempt at the same file, or an empty one"""
+        journal = cls(file_path, file_size, unique_id)
+        try:
+            with open(journal.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            chunk_size = stored['chunk_size']
+            if (stored['unique_id'] == unique_id and stored['size'] == file_size
+                    and valid_part_size(chunk_size, DOWNLOAD_PART_LIMITS)
+                    and os.path.getsize(file_path) == file_size):
+                for start, end in stored['ranges']:
+                    journal.done.update(range(start // chunk_size, math.ceil(end / chunk_size)))
+                journal.chunk_size = chunk_size
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return journal
+
+    def ranges(self, done):
+        """Merge chunk indexes into [start, end) byte ranges"""
+        ranges = []
+        for index in sorted(done):
+            start = index * self.chunk_size
+            end = min(start + self.chunk_size, self.file_size)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        return ranges
+
+    def save(self, fd, done):
+        """Sync the file, then record `done`; runs in an executor thread"""
+        os.fsync(fd)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'unique_id': self.unique_id,
+                'size': self.file_size,
+                'chunk_size': self.chunk_size,
+                'ranges': self.ranges(done),
+                'saved_at': time.time(),
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ParallelDownloader:
+    """Multi-connection ranged downloader with positional writes
+
+    Request size and the number of requests in flight come from chunk_tuner.
+    """
+
+    def __init__(self, connections=None):
+        self.connections = connections or Config.DOWNLOAD_CONNECTIONS
+
+    async def download(self, client, media, file_path, progress=None, on_chunk=None):
+        """Download a document into file_path using parallel range requests
+
+        Resumes from the journal of an interrupted attempt at the same path.
+        On failure the journal is brought up to date and the partial file is
+        left in place for the next attempt.
+        """
+        file_id = FileId.decode(media.file_id)
+        file_size = media.file_size
+        location = raw.types.InputDocumentFileLocation(
+            id=file_id.media_id,
+            access_hash=file_id.access_hash,
+            file_reference=file_id.file_reference,
+            thumb_size=file_id.thumbnail_size
+        )
+
+        journal = DownloadJournal.load(file_path, file_size, media.file_unique_id)
+        # A resumed download keeps the request size its journal was written with
+        chunk_size = journal.chunk_size or chunk_tuner.part_size('download', file_size, file_id.dc_id)
+        journal.chunk_size = chunk_size
+        tuner = chunk_tuner.start('download', chunk_size, file_id.dc_id)
+        total_chunks = math.ceil(file_size / chunk_size)
+        pending = asyncio.Queue()
+        for index in range(total_chunks):
+            if index not in journal.done:
+                pending.put_nowait(index)
+
+        loop = asyncio.get_running_loop()
+        downloaded = sum(min(chunk_size, file_size - index * chunk_size) for index in journal.done)
+        if downloaded:
+            logger.info(f"Resuming download at {downloaded}/{file_size} bytes")
+            if progress:
+                await progress(downloaded, file_size)
+
+        flags = os.O_RDWR | os.O_CREAT | (0 if journal.done else os.O_TRUNC)
+        fd = os.open(file_path, flags, 0o644)
+        stop_journal = asyncio.Event()
+        journal_writer = None
+        completed = False
+
+        async def write_journal():
+            while not stop_journal.is_set():
+                try:
+                    await asyncio.wait_for(stop_journal.wait(), Config.DOWNLOAD_JOURNAL_INTERVAL)
+                except asyncio.TimeoutError:
+                    await loop.run_in_executor(None, journal.save, fd, set(journal.done))
+
+        try:
+            self.preallocate(fd, file_size)
+            journal_writer = asyncio.ensure_future(write_journal())
+
+            async with MediaSessionPool(client, file_id.dc_id, self.connections) as pool:
+
+                async def worker(worker_index):
+                    nonlocal downloaded
+                    session = pool.session_for(worker_index)
+                    while True:
+                        await tuner.slot(worker_index)
+                        try:
+                            index = pending.get_nowait()
+                        except asyncio.QueueEmpty:
+                            tuner.drain()
+                            return
+
+                        offset = index * chunk_size
+                        try:
+                            r = await session.invoke(
+                                raw.functions.upload.GetFile(
+                                    location=location,
+                                    offset=offset,
+                                    limit=chunk_size
+                                ),
+                                sleep_threshold=30
+                            )
+                        except Exception:
+                            tuner.failed()
+                            raise
+                        if not isinstance(r, raw.types.upload.File):
+                            raise CdnRedirect("File is served from a CDN")
+
+                        await loop.run_in_executor(None, os.pwrite, fd, r.bytes, offset)
+                        journal.done.add(index)
+                        downloaded += len(r.bytes)
+                        tuner.record(len(r.bytes))
+                        if on_chunk:
+                            on_chunk(offset, r.bytes)
+
+                        if progress:
+                            await progress(downloaded, file_size)
+
+                workers = [
+                    asyncio.ensure_future(worker(i))
+                    for i in range(min(Config.MAX_TRANSFER_WINDOW, pending.qsize()))
+                ]
+                try:
+                    await asyncio.gather(*workers)
+                finally:
+                    for task in workers:
+                        if not task.done():
+                            task.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+            completed = True
+        finally:
+            tuner.finish()
+            # Let a save in progress finish before the file is closed
+            stop_journal.set()
+            if journal_writer:
+                await asyncio.gather(journal_writer, return_exceptions=True)
+            if not completed and journal.done:
+                # Keep what was written for the next attempt, cancellation included;
+                # a user's /cancel discards it when the staging area is released
+                try:
+                    await asyncio.shield(loop.run_in_executor(None, journal.save, fd, set(journal.done)))
+                except Exception as e:
+                    logger.warning(f"Download journal save failed: {e}")
+            os.close(fd)
+
+        if downloaded != file_size:
+            raise IOError(f"Incomplete download: {downloaded}/{file_size} bytes")
+
+        journal.remove()
+        return file_path
+
+    def preallocate(self, fd, file_size):
+        """Reserve the full file size up front"""
+        try:
+            os.posix_fallocate(fd, 0, file_size)
+        except (AttributeError, OSError):
+            os.ftruncate(fd, file_size)
+
+
+def journal_path(file_path):
+    """Journal file kept next to a partial download"""
+    return f"{file_path}.journal"
@@ -0,0 +1,190 @@
+import os
+import math
+import asyncio
+import logging
+from pyrogram import raw, types, utils
+from config import Config
+from media_sessions import MediaSessionPool
+from transfer_retry import retry_delay
+from chunk_tuner import chunk_tuner
+
+logger = logging.getLogger(__name__)
+
+# Telegram upload protocol constants
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024
+
+
+class PartUploader:
+    """Uploads document parts in parallel and commits them as a message
+
+    The part size is fixed per file, as the protocol requires; the number
+    of parts in flight follows chunk_tuner while the upload runs.
+    """
+
+    def __init__(self, client, file_name, file_size, connections=None):
+        self.client = client
+        self.file_name = file_name
+        self.file_size = file_size
+        self.file_id = client.rnd_id()
+        self.part_size = chunk_tuner.part_size('upload', file_size)
+        self.total_parts = max(1, math.ceil(file_size / self.part_size))
+        self.is_big = file_size > BIG_FILE_THRESHOLD
+        self.tuner = None  # the running attempt's window
+        self.pool = MediaSessionPool(client, size=connections or Config.UPLOAD_CONNECTIONS)
+        # Parts Telegram already holds under file_id; retried uploads skip them
+        self.saved = set()
+        self.saved_bytes = 0
+
+    async def start(self):
+        """Open (or, after a failed attempt, reopen) the media connections for the upload"""
+        await self.pool.start()
+
+    async def stop(self):
+        """Close the media connections"""
+        await self.pool.stop()
+
+    async def put_part(self, part_index, data, tuner=None):
+        """Upload a single part, retrying transient failures"""
+        if part_index in self.saved:
+            return
+        if self.is_big:
+            rpc = raw.functions.upload.SaveBigFilePart(
+                file_id=self.file_id,
+                file_part=part_index,
+                file_total_parts=self.total_parts,
+                bytes=data
+            )
+        else:
+            rpc = raw.functions.upload.SaveFilePart(
+                file_id=self.file_id,
+                file_part=part_index,
+                bytes=data
+            )
+
+        for attempt in range(1, Config.UPLOAD_PART_RETRIES + 1):
+            try:
+                await self.pool.session_for(part_index).invoke(rpc)
+                break
+            except Exception as e:
+                if tuner:
+                    tuner.failed()
+                delay = retry_delay(e, attempt)
+                # Long waits are left to the transfer retry, outside the stall watchdog
+                if delay is None or delay >= Config.STALL_TIMEOUT or attempt == Config.UPLOAD_PART_RETRIES:
+                    raise
+                logger.warning(f"Part {part_index} failed (attempt {attempt}): {e}")
+                await asyncio.sleep(delay)
+
+        self.saved.add(part_index)
+        self.saved_bytes += len(data)
+        if tuner:
+            tuner.record(len(data))
+
+    async def upload_parts(self, parts: asyncio.Queue, progress=None):
+        """Upload (index, bytes) items from a queue until a None sentinel"""
+        if progress and self.saved_bytes:
+            await progress(self.saved_bytes, self.file_size)
+
+        tuner = self.tuner = chunk_tuner.start('upload', self.part_size)
+
+        async def worker(worker_index):
+            while True:
+                await tuner.slot(worker_index)
+                item = await parts.get()
+                if item is None:
+                    # Leave the sentinel for the other workers
+                    parts.put_nowait(None)
+                    tuner.drain()
+                    return
+                index, data = item
+                await self.put_part(index, data, tuner)
+                if progress:
+                    await progress(self.saved_bytes, self.file_size)
+
+        workers = [asyncio.ensure_future(worker(i)) for i in range(Config.MAX_TRANSFER_WINDOW)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            tuner.finish()
+            for task in workers:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        return self.saved_bytes
+
+    async def upload_file(self, file_path, progress=None):
+        """Upload a local file with several parts in flight, skipping parts already saved"""
+        parts = asyncio.Queue(maxsize=Config.MAX_TRANSFER_WINDOW)
+        loop = asyncio.get_running_loop()
+
+        async def read_parts():
+            with open(file_path, 'rb') as f:
+                for index in range(self.total_parts):
+                    if index in self.saved:
+                        continue
+                    f.seek(index * self.part_size)
+                    data = await loop.run_in_executor(None, f.read, self.part_size)
+                    await parts.put((index, data))
+            await parts.put(None)
+
+        reader = asyncio.ensure_future(read_parts())
+        try:
+            uploaded, _ = await asyncio.gather(self.upload_parts(parts, progress), reader)
+        finally:
+            if not reader.done():
+                reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+        return uploaded
+
+    def input_file(self):
+        """Build the InputFile referencing the uploaded parts"""
+        if self.is_big:
+            return raw.types.InputFileBig(
+                id=self.file_id,
+                parts=self.total_parts,
+                name=self.file_name
+            )
+        # An empty checksum tells Telegram to skip the md5 verification
+        return raw.types.InputFile(
+            id=self.file_id,
+            parts=self.total_parts,
+            name=self.file_name,
+            md5_checksum=""
+        )
+
+    async def commit(self, chat_id, caption="", thumb=None):
+        """Send the uploaded parts as a document message"""
+        client = self.client
+        media = raw.types.InputMediaUploadedDocument(
+            mime_type=client.guess_mime_type(self.file_name) or "application/zip",
+            file=self.input_file(),
+            thumb=await client.save_file(thumb) if thumb else None,
+            force_file=True,
+            attributes=[
+                raw.types.DocumentAttributeFilename(file_name=self.file_name)
+            ]
+        )
+
+        r = await client.invoke(
+            raw.functions.messages.SendMedia(
+                peer=await client.resolve_peer(chat_id),
+                media=media,
+                random_id=client.rnd_id(),
+                **await utils.parse_text_entities(client, caption, None, None)
+            )
+        )
+
+        for update in r.updates:
+            if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                return await types.Message._parse(
+                    client, update.message,
+                    {u.id: u for u in r.users},
+                    {c.id: c for c in r.chats}
+                )
+        return None
+
+
+def target_file_name(original_name, new_name):
+    """Apply the new name while keeping the original extension"""
+    return f"{new_name}{os.path.splitext(original_name)[1]}"
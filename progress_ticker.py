@@ -0,0 +1,245 @@
+import time
+import asyncio
+from pyrogram.errors import FloodWait, MessageNotModified
+from config import Config
+from metrics import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+PHASE_TITLES = {
+    'QUEUED': "⏳ **Waiting In Queue**",
+    'STARTING': "⚡ **Processing Started**",
+    'DOWNLOADING': "📥 **Downloading File**",
+    'UPLOADING': "📤 **Uploading File**",
+    'STREAMING': "⚡ **Streaming File**",
+}
+
+
+class TransferProgress:
+    """Per-job progress counters, written by transfers and read by the ticker"""
+
+    def __init__(self, status_message=None, file_name=None):
+        self.status_message = status_message
+        self.file_name = file_name
+        self.phase = 'STARTING'
+        self.current = 0
+        self.total = 0
+        self.details = {}
+        self.started_at = time.time()
+        self.phase_started_at = self.started_at
+        self.cancelled = False  # set by /cancel: partial files are discarded, not kept for resuming
+        # Ticker bookkeeping
+        self.last_text = ""
+        self.next_edit_at = 0
+        self.edit_task = None
+
+    def set_phase(self, phase, total=0, file_name=None):
+        """Switch to a new transfer phase and reset its counters"""
+        self.phase = phase
+        self.current = 0
+        self.total = total
+        self.phase_started_at = time.time()
+        if file_name:
+            self.file_name = file_name
+
+    def update(self, current, total=None):
+        """Record transferred bytes (plain writes, safe to call per chunk)"""
+        self.current = current
+        if total:
+            self.total = total
+
+    async def on_progress(self, current, total, *args):
+        """Progress callback compatible with pyrogram transfers"""
+        self.update(current, total)
+
+    def render(self):
+        """Render the current state as a status message"""
+        lines = [PHASE_TITLES.get(self.phase, f"⚡ **{self.phase.title()}**"), ""]
+
+        if self.file_name:
+            lines.append(f"**File:** `{self.file_name}`")
+
+        if self.total:
+            elapsed = time.time() - self.phase_started_at
+            percent = min(self.current / self.total * 100, 100)
+            speed = self.current / elapsed if elapsed > 0 else 0
+            eta = (self.total - self.current) / speed if speed > 0 else 0
+            filled = int(20 * percent // 100)
+
+            lines.append(f"`{'█' * filled}{'░' * (20 - filled)}`")
+            lines.append(f"**Progress:** {percent:.1f}%")
+            lines.append(f"**Speed:** {format_bytes(speed)}/s")
+            lines.append(f"**ETA:** {format_time(eta)} | **Elapsed:** {format_time(elapsed)}")
+            lines.append(f"**Transferred:** {format_bytes(self.current)} / {format_bytes(self.total)}")
+
+        for label, value in self.details.items():
+            lines.append(f"**{label}:** {value}")
+
+        return "\n".join(lines)
+
+
+class BatchProgress(TransferProgress):
+    """One dashboard for a batch of jobs, rendered from their individual progress"""
+
+    # Share of a file's work done once a phase completes, and the share the phase covers
+    PHASE_WEIGHTS = {
+        'DOWNLOADING': (0.0, 0.5),
+        'UPLOADING': (0.5, 0.5),
+        'STREAMING': (0.0, 1.0),
+    }
+    MAX_LINES = 15
+
+    def __init__(self, status_message, items):
+        super().__init__(status_message)
+        self.items = items  # list of (file_name, file_size, TransferProgress)
+        self.results = {}  # item index -> (success, error)
+
+    def finish(self, index, success, error=None):
+        self.results[index] = (success, error)
+
+    @property
+    def done(self):
+        return len(self.results) == len(self.items)
+
+    def fraction(self, index):
+        """Share of one item's work that is done"""
+        if index in self.results:
+            return 1.0
+        progress = self.items[index][2]
+        base, span = self.PHASE_WEIGHTS.get(progress.phase, (0.0, 0.0))
+        if progress.total:
+            return base + span * min(progress.current / progress.total, 1)
+        return base
+
+    def render(self):
+        total_size = sum(size for _, size, _ in self.items) or 1
+        percent = sum(size * self.fraction(i) for i, (_, size, _) in enumerate(self.items)) / total_size * 100
+        succeeded = sum(1 for success, _ in self.results.values() if success)
+        filled = int(20 * percent // 100)
+
+        title = "📦 **Batch Complete**" if self.done else "📦 **Batch Rename**"
+        lines = [
+            title, "",
+            f"**Files:** {len(self.results)}/{len(self.items)} done, {succeeded} renamed",
+            f"`{'█' * filled}{'░' * (20 - filled)}`",
+            f"**Progress:** {percent:.1f}% of {format_bytes(total_size)}",
+            f"**Elapsed:** {format_time(time.time() - self.started_at)}",
+            "",
+        ]
+
+        for index, (file_name, _, progress) in enumerate(self.items[:self.MAX_LINES]):
+            if index in self.results:
+                success, error = self.results[index]
+                lines.append(f"✅ `{file_name}`" if success else f"❌ `{file_name}` — {error}")
+            elif progress.phase == 'QUEUED':
+                lines.append(f"⏳ `{file_name}`")
+            else:
+                lines.append(f"⚡ `{file_name}` {self.fraction(index) * 100:.0f}%")
+        if len(self.items) > self.MAX_LINES:
+            lines.append(f"…and {len(self.items) - self.MAX_LINES} more")
+
+        for label, value in self.details.items():
+            lines.append(f"**{label}:** {value}")
+
+        return "\n".join(lines)
+
+
+class ProgressTicker:
+    """Single background task that edits status messages for all active jobs"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.task = None
+        self.tokens = float(Config.PROGRESS_EDITS_PER_SECOND)
+        self.last_refill = time.monotonic()
+
+    def register(self, progress: TransferProgress):
+        """Start rendering a job"""
+        self.jobs[id(progress)] = progress
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+
+    async def unregister(self, progress: TransferProgress):
+        """Stop rendering a job and wait for its in-flight edit"""
+        self.jobs.pop(id(progress), None)
+        if progress.edit_task and not progress.edit_task.done():
+            await asyncio.gather(progress.edit_task, return_exceptions=True)
+
+    async def run(self):
+        """Ticker loop"""
+        while self.jobs:
+            self.tick()
+            await asyncio.sleep(Config.PROGRESS_TICK_INTERVAL)
+
+    def tick(self):
+        """Launch edits for due jobs within the global edit budget"""
+        now = time.monotonic()
+        rate = Config.PROGRESS_EDITS_PER_SECOND
+        self.tokens = min(float(rate), self.tokens + (now - self.last_refill) * rate)
+        self.last_refill = now
+
+        due = [
+            job for job in self.jobs.values()
+            if job.status_message is not None
+            and now >= job.next_edit_at
+            and (job.edit_task is None or job.edit_task.done())
+        ]
+        # Longest-waiting jobs first so every job gets its turn
+        due.sort(key=lambda job: job.next_edit_at)
+
+        for job in due:
+            if self.tokens < 1:
+                break
+            # Rendered now, so an edit always carries the newest state
+            text = job.render()
+            if text == job.last_text:
+                continue
+            self.tokens -= 1
+            job.next_edit_at = now + Config.PROGRESS_MIN_EDIT_INTERVAL
+            job.edit_task = asyncio.ensure_future(self.edit(job, text))
+
+    async def edit(self, job, text):
+        """Edit one status message, never blocking the transfer"""
+        try:
+            await job.status_message.edit_text(text)
+            job.last_text = text
+        except MessageNotModified:
+            job.last_text = text
+        except FloodWait as e:
+            metrics.flood_waits.inc(1, 'status')
+            logger.info(f"Flood wait: {e.value}s, delaying status updates")
+            job.next_edit_at = time.monotonic() + e.value
+        except Exception as e:
+            logger.debug(f"Status edit failed: {e}")
+
+
+def format_bytes(size):
+    """Format bytes to human readable"""
+    if not size or size <= 0:
+        return "0 B"
+
+    units = ['B', 'KB', 'MB', 'GB']
+    unit_index = 0
+
+    while size >= 1024 and unit_index < len(units) - 1:
+        size /= 1024.0
+        unit_index += 1
+
+    return f"{size:.1f} {units[unit_index]}"
+
+
+def format_time(seconds):
+    """Format time in a human-readable way"""
+    if seconds < 60:
+        return f"{int(seconds)}s"
+    elif seconds < 3600:
+        return f"{int(seconds // 60)}m {int(seconds % 60)}s"
+    else:
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
+        return f"{hours}h {minutes}m"
+
+
+# Process-wide ticker shared by all jobs
+progress_ticker = ProgressTicker()
@@ -0,0 +1,123 @@
+import time
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindow:
+    """Sliding-window counter: the previous window's total, weighted by its overlap, plus the current one"""
+
+    __slots__ = ('started_at', 'previous', 'current')
+
+    def __init__(self, started_at=0.0, previous=0, current=0):
+        self.started_at = started_at
+        self.previous = previous
+        self.current = current
+
+    def roll(self, now, window):
+        elapsed = now - self.started_at
+        if elapsed < window:
+            return
+        # One window later the current total becomes the previous one; later than that nothing is left
+        self.previous = self.current if elapsed < 2 * window else 0
+        self.current = 0
+        self.started_at = now - elapsed % window
+
+    def usage(self, now, window):
+        self.roll(now, window)
+        overlap = 1 - (now - self.started_at) / window
+        return self.previous * overlap + self.current
+
+    def allows(self, amount, limit, now, window):
+        return self.usage(now, window) + amount <= limit
+
+    def add(self, amount):
+        self.current += amount
+
+    def retry_after(self, amount, limit, now, window):
+        """Seconds until amount fits under limit, assuming no further use"""
+        if amount > limit:
+            return None
+        self.roll(now, window)
+        into_window = now - self.started_at
+        if self.current + amount <= limit:
+            # Fits once enough of the previous window has slid out
+            share = (self.previous + self.current + amount - limit) / self.previous if self.previous else 0
+            return max(share * window - into_window, 0)
+        # Otherwise the current window has to become the previous one and slide out in turn
+        share = (self.current + amount - limit) / self.current
+        return window - into_window + share * window
+
+    def to_list(self):
+        return [self.started_at, self.previous, self.current]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values) if values else cls()
+
+
+class RateLimiter:
+    """Per-user file and byte limits by tier, plus a global byte budget"""
+
+    def __init__(self):
+        self.global_bytes = SlidingWindow()
+
+    def tier(self, user_id):
+        name = 'premium' if user_id in Config.PREMIUM_USERS else 'default'
+        return name, Config.RATE_LIMIT_TIERS[name]
+
+    def check_file(self, session, file_size):
+        """Admit a new file; returns (allowed, reason, retry_after)"""
+        now = time.time()
+        window = Config.RATE_LIMIT_WINDOW
+        _, limits = self.tier(session.user_id)
+
+        if not session.file_window.allows(1, limits['files'], now, window):
+            return False, f"{limits['files']} files per hour", session.file_window.retry_after(1, limits['files'], now, window)
+        # Only a pre-check; bytes are charged when the transfer is about to start
+        if not session.byte_window.allows(file_size, limits['bytes'], now, window):
+            return False, f"{format_bytes(limits['bytes'])} per hour", \
+                session.byte_window.retry_after(file_size, limits['bytes'], now, window)
+
+        session.file_window.add(1)
+        return True, None, 0
+
+    def reserve_bytes(self, session, file_size):
+        """Charge a transfer to the user's and the global byte budget; returns (allowed, reason, retry_after)"""
+        now = time.time()
+        window = Config.RATE_LIMIT_WINDOW
+        _, limits = self.tier(session.user_id)
+
+        if not session.byte_window.allows(file_size, limits['bytes'], now, window):
+            return False, f"{format_bytes(limits['bytes'])} per hour", \
+                session.byte_window.retry_after(file_size, limits['bytes'], now, window)
+        allowed, reason, retry_after = self.reserve_global_bytes(file_size)
+        if allowed:
+            session.byte_window.add(file_size)
+        return allowed, reason, retry_after
+
+    def reserve_global_bytes(self, file_size):
+        """Charge a transfer to the bot-wide byte budget only (API jobs have no session)"""
+        now = time.time()
+        window = Config.RATE_LIMIT_WINDOW
+        budget = Config.GLOBAL_BYTES_PER_HOUR
+        if budget and not self.global_bytes.allows(file_size, budget, now, window):
+            logger.info("Global transfer budget exhausted")
+            return False, "bot-wide transfer budget", self.global_bytes.retry_after(file_size, budget, now, window)
+
+        self.global_bytes.add(file_size)
+        return True, None, 0
+
+
+def format_bytes(size):
+    """Format bytes to human readable"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024.0:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} TB"
+
+
+# Process-wide rate limiter
+rate_limiter = RateLimiter()
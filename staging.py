@@ -0,0 +1,254 @@
+import os
+import time
+import shutil
+import asyncio
+import uuid
+from config import Config
+from metrics import metrics
+from file_cache import file_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StagingFull(Exception):
+    """Raised when a file cannot get disk space for its download"""
+
+
+class StagingArea:
+    """A job's private download directory and its disk reservation"""
+
+    def __init__(self, manager, path, size):
+        self.manager = manager
+        self.path = path
+        self.size = size
+
+    def path_for(self, file_name):
+        """Where a file of this job is written; names cannot leave the directory"""
+        return os.path.join(self.path, os.path.basename(file_name or '') or 'file')
+
+    def allocated(self):
+        """Disk blocks already taken by the job's files"""
+        return directory_allocated(self.path)
+
+    def has_partial(self):
+        """Whether an interrupted download journal is waiting here to be resumed"""
+        try:
+            return any(name.endswith('.journal') for name in os.listdir(self.path))
+        except OSError:
+            return False
+
+    def release(self, discard=False):
+        """Return the reservation and delete the directory, unless it holds a
+        resumable partial download and `discard` is not set; safe to call twice"""
+        self.manager.release(self, discard)
+
+
+class StagingManager:
+    """Per-job staging directories with free-space admission control
+
+    Each download reserves its declared size before it starts. Jobs wait
+    (first come, first served) while reservations would eat into the
+    safety margin, and are rejected when the file could never fit. Cached
+    downloads on the same disk are evicted before a job has to wait.
+
+    Directories are named after the file when a key is given, so an
+    interrupted download is parked on release and picked up again by the
+    next job for the same file.
+    """
+
+    def __init__(self, root=None, margin=None):
+        self.root = root or Config.STAGING_DIR
+        self.margin = Config.STAGING_FREE_MARGIN if margin is None else margin
+        self.areas = {}  # path -> StagingArea
+        self.parked = {}  # path -> parked_at, interrupted downloads kept for resuming
+        self.waiters = []  # reservation tickets, oldest first
+        self.changed = asyncio.Event()
+        self.loaded = False
+
+    def load(self):
+        """Reconcile staging left by a previous process: reattach resumable
+        partial downloads, delete everything else"""
+        if self.loaded:
+            return
+        self.loaded = True
+        os.makedirs(self.root, exist_ok=True)
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if path in self.areas:
+                continue
+            journals = [
+                os.path.join(path, entry) for entry in os.listdir(path) if entry.endswith('.journal')
+            ] if os.path.isdir(path) else []
+            saved_at = max((os.path.getmtime(journal) for journal in journals), default=0)
+            if time.time() - saved_at < Config.PARTIAL_MAX_AGE:
+                logger.info(f"Keeping partial download for resume: {name}")
+                self.parked[path] = saved_at
+            else:
+                logger.info(f"Removing stale staging directory: {name}")
+                self.remove(path)
+
+    def remove(self, path):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def expire_parked(self, needed=0):
+        """Drop partials past their age, then the oldest while `needed` bytes don't fit"""
+        now = time.time()
+        for path, parked_at in sorted(self.parked.items(), key=lambda item: item[1]):
+            if now - parked_at >= Config.PARTIAL_MAX_AGE or (needed and needed > self.available()):
+                logger.info(f"Dropping partial download: {os.path.basename(path)}")
+                del self.parked[path]
+                self.remove(path)
+
+    @property
+    def reserved(self):
+        return sum(area.size for area in self.areas.values())
+
+    def used(self):
+        """Bytes staged downloads take on disk, parked partials included"""
+        return sum(directory_allocated(path) for path in [*self.areas, *self.parked])
+
+    def outstanding(self):
+        """Reserved bytes not yet written to disk"""
+        return sum(max(0, area.size - area.allocated()) for area in self.areas.values())
+
+    def available(self):
+        """Bytes a new reservation may take right now"""
+        return shutil.disk_usage(self.root).free - self.outstanding() - self.margin
+
+    def capacity(self):
+        """Bytes a reservation could take once every running job has finished"""
+        in_use = sum(area.allocated() for area in self.areas.values())
+        return shutil.disk_usage(self.root).free + in_use + self.cache_evictable() - self.margin
+
+    def cache_evictable(self):
+        """Download cache bytes that could be evicted to make room, if the cache shares the disk"""
+        try:
+            os.makedirs(file_cache.root, exist_ok=True)
+            if os.stat(file_cache.root).st_dev != os.stat(self.root).st_dev:
+                return 0
+        except OSError:
+            return 0
+        return file_cache.evictable()
+
+    def make_room(self, needed):
+        """Evict download cache files when that alone lets `needed` bytes fit now"""
+        shortfall = needed - self.available()
+        if 0 < shortfall <= self.cache_evictable():
+            freed = file_cache.free(shortfall)
+            logger.info(f"Evicted {format_bytes(freed)} of cached downloads for staging")
+
+    async def reserve(self, size, progress=None, key=None):
+        """Reserve `size` bytes and create a private directory for one job
+
+        `key` (the file_unique_id) names the directory, reattaching a parked
+        partial download of the same file; jobs running the same file at
+        the same time get anonymous directories.
+        """
+        self.load()
+        path = os.path.join(self.root, key) if key else None
+        if path in self.areas:
+            path = None
+        parked_at = self.parked.pop(path, None)
+        # A resumed download already holds part of its size on disk
+        needed = max(0, size - directory_allocated(path)) if parked_at else size
+
+        ticket = object()
+        self.waiters.append(ticket)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + Config.STAGING_WAIT_TIMEOUT
+        try:
+            self.expire_parked(needed)
+            if needed > self.capacity():
+                raise StagingFull(f"Not enough disk space for {format_bytes(size)}")
+            if self.waiters[0] is ticket:
+                self.make_room(needed)
+            while self.waiters[0] is not ticket or needed > self.available():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise StagingFull("Timed out waiting for disk space")
+                if progress:
+                    progress.details['Disk'] = "⏳ Waiting for free space"
+                # Releases wake waiters at once; the recheck catches space freed elsewhere
+                self.changed.clear()
+                try:
+                    await asyncio.wait_for(self.changed.wait(), min(remaining, Config.STAGING_RECHECK_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+                self.expire_parked(needed)
+                if self.waiters[0] is ticket:
+                    self.make_room(needed)
+        except BaseException:
+            if parked_at:
+                self.parked[path] = parked_at
+            raise
+        finally:
+            self.waiters.remove(ticket)
+            # The next waiter may now be at the head of the queue
+            self.changed.set()
+            if progress:
+                progress.details.pop('Disk', None)
+
+        if not path or path in self.areas:
+            path = os.path.join(self.root, uuid.uuid4().hex[:12])
+        elif parked_at:
+            logger.info(f"Reattached partial download: {key}")
+        os.makedirs(path, exist_ok=True)
+        area = StagingArea(self, path, size)
+        self.areas[path] = area
+        return area
+
+    def release(self, area, discard=False):
+        """Free an area; partials survive crashes and failures, but not a user's cancel"""
+        if self.areas.pop(area.path, None) is None:
+            return
+        if not discard and area.has_partial():
+            self.parked[area.path] = time.time()
+        else:
+            shutil.rmtree(area.path, ignore_errors=True)
+        self.changed.set()
+
+    def release_path(self, file_path):
+        """Release the area holding a file, for callers that only kept the path"""
+        directory = os.path.dirname(os.path.abspath(file_path))
+        for area in list(self.areas.values()):
+            if os.path.abspath(area.path) == directory:
+                area.release()
+
+
+def directory_allocated(path):
+    """Disk blocks taken by the files directly inside a directory"""
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    total += entry.stat(follow_symlinks=False).st_blocks * 512
+                except (OSError, AttributeError):
+                    pass
+    except OSError:
+        pass
+    return total
+
+
+def format_bytes(size):
+    """Format bytes to human readable"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024.0:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} TB"
+
+
+# Process-wide staging manager for downloads
+staging_manager = StagingManager()
+metrics.gauge("renamer_staging_reserved_bytes", "Disk space reserved by running downloads",
+              lambda: staging_manager.reserved)
+metrics.gauge("renamer_staging_used_bytes", "Disk space taken by staged and parked downloads",
+              staging_manager.used)
@@ -0,0 +1,208 @@
+import os
+import json
+import math
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import (
+    create_engine, MetaData, Table, Column, BigInteger, String, Float, Text, select, delete, update
+)
+from config import Config
+from timing_wheel import TimingWheel
+from user_session import UserSession
+import logging
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+sessions_table = Table(
+    "sessions", metadata,
+    Column("user_id", BigInteger, primary_key=True),
+    Column("data", Text, nullable=False),
+    Column("updated_at", Float, nullable=False),
+)
+
+jobs_table = Table(
+    "jobs", metadata,
+    Column("job_id", String(16), primary_key=True),
+    Column("user_id", BigInteger, index=True),
+    Column("chat_id", BigInteger),
+    Column("file_name", Text),
+    Column("file_size", BigInteger),
+    Column("status", String(16), index=True),
+    Column("error", Text),
+    Column("created_at", Float),
+    Column("updated_at", Float),
+)
+
+
+class StateStore:
+    """Sessions and job records in SQL, written behind by one background flusher"""
+
+    def __init__(self, url=None):
+        self.url = url or Config.DATABASE_URL
+        self.engine = None
+        self.sessions = {}  # user_id -> UserSession, restored on first use
+        self.dirty_sessions = set()
+        self.evicted_rows = {}  # user_id -> row of a dirty session that expired before its flush
+        # Idle sessions leave memory; they are restored from the database when the user comes back
+        self.expiry = TimingWheel(
+            math.ceil(Config.SESSION_IDLE_TTL / Config.SESSION_WHEEL_RESOLUTION) + 1,
+            Config.SESSION_WHEEL_RESOLUTION
+        )
+        self.dirty_jobs = {}  # job_id -> row
+        self.flush_needed = asyncio.Event()
+        self.flusher = None
+        # One thread owns the engine, so writes are serialized off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state")
+
+    async def start(self):
+        """Create tables, close out jobs of the previous run and start the flusher"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.open)
+        self.flusher = asyncio.ensure_future(self.run_flusher())
+
+    async def stop(self):
+        """Stop the flusher and write everything still pending"""
+        if self.flusher:
+            self.flusher.cancel()
+            await asyncio.gather(self.flusher, return_exceptions=True)
+            self.flusher = None
+        await self.flush()
+
+    def open(self):
+        if self.url.startswith("sqlite:///"):
+            os.makedirs(os.path.dirname(self.url[len("sqlite:///"):]) or '.', exist_ok=True)
+        self.engine = create_engine(self.url)
+        metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(jobs_table)
+                .where(jobs_table.c.status.in_(('queued', 'running')))
+                .values(status='interrupted', updated_at=time.time())
+            )
+        if result.rowcount:
+            logger.info(f"Marked {result.rowcount} unfinished jobs as interrupted")
+
+    async def load_session(self, user_id):
+        """Session of a user, read from the database the first time it is needed"""
+        session = self.sessions.get(user_id)
+        if session is not None:
+            self.expiry.schedule(user_id, Config.SESSION_IDLE_TTL)
+            return session
+
+        restored = None
+        # An expired session whose last change is not written yet is still authoritative
+        row = self.evicted_rows.pop(user_id, None)
+        if row is not None:
+            self.dirty_sessions.add(user_id)
+        elif self.engine:
+            loop = asyncio.get_running_loop()
+            try:
+                row = await loop.run_in_executor(self.executor, self.read_session, user_id)
+            except Exception as e:
+                logger.warning(f"Session restore failed for {user_id}: {e}")
+        if row:
+            try:
+                restored = UserSession.from_dict(user_id, json.loads(row))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Discarding unreadable session of {user_id}: {e}")
+
+        # A concurrent handler may have created the session meanwhile
+        session = self.sessions.setdefault(user_id, restored or UserSession(user_id))
+        self.expiry.schedule(user_id, Config.SESSION_IDLE_TTL)
+        return session
+
+    def save_session(self, user_id):
+        """Queue a user's session for the next flush"""
+        if user_id not in self.sessions:
+            return
+        self.dirty_sessions.add(user_id)
+        self.expiry.schedule(user_id, Config.SESSION_IDLE_TTL)
+        self.wake()
+
+    def expire_sessions(self):
+        """Drop sessions that have been idle for SESSION_IDLE_TTL"""
+        for user_id in self.expiry.advance():
+            session = self.sessions.pop(user_id, None)
+            if session and user_id in self.dirty_sessions:
+                self.dirty_sessions.discard(user_id)
+                self.evicted_rows[user_id] = json.dumps(session.to_dict())
+
+    def save_job(self, job, status, error=None):
+        """Queue a job record for the next flush"""
+        self.dirty_jobs[job.id] = {
+            'job_id': job.id,
+            'user_id': job.user_id,
+            'chat_id': job.chat_id,
+            'file_name': job.file_name,
+            'file_size': job.file_size,
+            'status': status,
+            'error': error,
+            'created_at': job.started_at,
+            'updated_at': time.time(),
+        }
+        self.wake()
+
+    def wake(self):
+        if len(self.dirty_sessions) + len(self.dirty_jobs) >= Config.STATE_FLUSH_MAX_PENDING:
+            self.flush_needed.set()
+
+    async def run_flusher(self):
+        """Write dirty state every STATE_FLUSH_INTERVAL seconds, or sooner when a lot is pending"""
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_needed.wait(), Config.STATE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_needed.clear()
+            self.expire_sessions()
+            await self.flush()
+
+    async def flush(self):
+        if not self.engine or not (self.dirty_sessions or self.evicted_rows or self.dirty_jobs):
+            return
+
+        # Sessions are encoded at flush time, so repeated changes collapse into one row write
+        now = time.time()
+        session_rows = [
+            {'user_id': user_id, 'data': json.dumps(self.sessions[user_id].to_dict()), 'updated_at': now}
+            for user_id in self.dirty_sessions if user_id in self.sessions
+        ]
+        session_rows.extend(
+            {'user_id': user_id, 'data': data, 'updated_at': now}
+            for user_id, data in self.evicted_rows.items()
+        )
+        job_rows = list(self.dirty_jobs.values())
+        self.dirty_sessions = set()
+        self.evicted_rows = {}
+        self.dirty_jobs = {}
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.write, session_rows, job_rows)
+        except Exception as e:
+            logger.error(f"State flush failed: {e}")
+
+    def write(self, session_rows, job_rows):
+        """Replace the given rows in a single transaction"""
+        with self.engine.begin() as conn:
+            for table, key, rows in (
+                (sessions_table, sessions_table.c.user_id, session_rows),
+                (jobs_table, jobs_table.c.job_id, job_rows),
+            ):
+                if not rows:
+                    continue
+                conn.execute(delete(table).where(key.in_([row[key.name] for row in rows])))
+                conn.execute(table.insert(), rows)
+
+    def read_session(self, user_id):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(sessions_table.c.data).where(sessions_table.c.user_id == user_id)
+            ).scalar()
+
+
+# Process-wide persistent state
+state_store = StateStore()
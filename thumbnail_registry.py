@@ -0,0 +1,160 @@
+import io
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from PIL import Image, ImageDraw, ImageFont
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Worker pool for thumbnail decoding and encoding, off the event loop
+thumbnail_pool = ThreadPoolExecutor(max_workers=Config.THUMBNAIL_WORKERS, thread_name_prefix="thumb")
+
+
+class ThumbnailEntry:
+    """An encoded, upload-ready JPEG thumbnail"""
+
+    def __init__(self, key, data, source):
+        self.key = key
+        self.data = data
+        self.source = source
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def as_file(self):
+        """Fresh in-memory file handle for one upload"""
+        stream = io.BytesIO(self.data)
+        stream.name = "thumb.jpg"
+        return stream
+
+
+class ThumbnailRegistry:
+    """Process-wide registry that renders and optimizes each thumbnail once"""
+
+    def __init__(self):
+        self.entries = {}  # content hash -> ThumbnailEntry
+        self._global = None
+
+    def global_thumbnail(self):
+        """Configured custom thumbnail, or the generated default"""
+        if self._global is None:
+            entry = None
+            if os.path.exists(Config.CUSTOM_THUMBNAIL):
+                try:
+                    entry = self.from_file(Config.CUSTOM_THUMBNAIL)
+                    logger.info("Custom thumbnail loaded and processed")
+                except Exception as e:
+                    logger.warning(f"Custom thumbnail failed: {e}")
+            self._global = entry or self.default()
+        return self._global
+
+    def from_file(self, path):
+        """Thumbnail for an image file, keyed by the file's content"""
+        with open(path, 'rb') as f:
+            return self.from_bytes(f.read(), source=os.path.basename(path))
+
+    def from_bytes(self, raw, source="image"):
+        """Thumbnail for encoded image bytes, keyed by their content"""
+        key = hashlib.sha256(raw).hexdigest()[:16]
+        entry = self.entries.get(key)
+        if entry:
+            return entry
+
+        with Image.open(io.BytesIO(raw)) as img:
+            data = encode_thumbnail(img)
+        return self.add(key, data, source)
+
+    def default(self):
+        """Generated 'TURBO BOT' thumbnail"""
+        key = hashlib.sha256(f"default:{Config.THUMBNAIL_SIZE}".encode()).hexdigest()[:16]
+        entry = self.entries.get(key)
+        if entry:
+            return entry
+
+        try:
+            data = render_default_thumbnail()
+        except Exception as e:
+            logger.error(f"Failed to create thumbnail: {e}")
+            return None
+        logger.info("Default thumbnail created successfully")
+        return self.add(key, data, "default")
+
+    def add(self, key, data, source):
+        entry = ThumbnailEntry(key, data, source)
+        self.entries[key] = entry
+        return entry
+
+
+def encode_thumbnail(img):
+    """Resize and encode an image as an upload-ready JPEG"""
+    # Convert to RGB if necessary
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    img.thumbnail(Config.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=85, optimize=True)
+    return out.getvalue()
+
+
+def render_default_thumbnail():
+    """Draw the default gradient thumbnail"""
+    width, height = Config.THUMBNAIL_SIZE
+    img = Image.new('RGB', Config.THUMBNAIL_SIZE, color='#2563eb')
+    draw = ImageDraw.Draw(img)
+
+    # Add gradient effect
+    for i in range(height):
+        draw.line([(0, i), (width, i)], fill=interpolate_color('#2563eb', '#1e40af', i / height))
+
+    title_font, subtitle_font = load_fonts()
+
+    # Add main text
+    text = "TURBO BOT"
+    bbox = draw.textbbox((0, 0), text, font=title_font)
+    x = (width - (bbox[2] - bbox[0])) // 2
+    y = height // 2 - 30
+    draw.text((x, y), text, font=title_font, fill='white')
+
+    # Add subtitle
+    subtitle = "File Renamer"
+    bbox = draw.textbbox((0, 0), subtitle, font=subtitle_font)
+    x_sub = (width - (bbox[2] - bbox[0])) // 2
+    draw.text((x_sub, y + 50), subtitle, font=subtitle_font, fill='#e5e7eb')
+
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=90, optimize=True)
+    return out.getvalue()
+
+
+def load_fonts():
+    """Best available title and subtitle fonts"""
+    for bold, regular in (
+        ("arialbd.ttf", "arial.ttf"),
+        ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+    ):
+        try:
+            return ImageFont.truetype(bold, 36), ImageFont.truetype(regular, 18)
+        except OSError:
+            continue
+    return ImageFont.load_default(), ImageFont.load_default()
+
+
+def interpolate_color(color1, color2, ratio):
+    """Create gradient color"""
+    r1, g1, b1 = int(color1[1:3], 16), int(color1[3:5], 16), int(color1[5:7], 16)
+    r2, g2, b2 = int(color2[1:3], 16), int(color2[3:5], 16), int(color2[5:7], 16)
+
+    r = int(r1 + (r2 - r1) * ratio)
+    g = int(g1 + (g2 - g1) * ratio)
+    b = int(b1 + (b2 - b1) * ratio)
+
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+# Process-wide thumbnail registry
+thumbnail_registry = ThumbnailRegistry()
@@ -0,0 +1,51 @@
+import math
+import time
+
+
+class TimingWheel:
+    """Hashed timing wheel: O(1) schedule and cancel, and per tick only the due bucket is touched"""
+
+    def __init__(self, slots, resolution):
+        self.slots = slots
+        self.resolution = resolution
+        self.buckets = [set() for _ in range(slots)]
+        self.position = {}  # key -> bucket index
+        self.current_tick = int(time.monotonic() // resolution)
+
+    def __len__(self):
+        return len(self.position)
+
+    def schedule(self, key, delay):
+        """(Re)schedule key to expire after delay seconds, capped at the wheel's horizon"""
+        ticks = min(max(1, math.ceil(delay / self.resolution)), self.slots - 1)
+        index = (self.current_tick + ticks) % self.slots
+        old = self.position.get(key)
+        if old == index:
+            return
+        if old is not None:
+            self.buckets[old].discard(key)
+        self.buckets[index].add(key)
+        self.position[key] = index
+
+    def cancel(self, key):
+        index = self.position.pop(key, None)
+        if index is not None:
+            self.buckets[index].discard(key)
+
+    def advance(self, now=None):
+        """Move the wheel to now and return the keys that expired on the way"""
+        target = int((now or time.monotonic()) // self.resolution)
+        expired = []
+        # A full turn visits every bucket, so longer gaps need no extra steps
+        steps = min(target - self.current_tick, self.slots)
+        for _ in range(max(steps, 0)):
+            self.current_tick += 1
+            index = self.current_tick % self.slots
+            bucket = self.buckets[index]
+            if bucket:
+                self.buckets[index] = set()
+                for key in bucket:
+                    del self.position[key]
+                expired.extend(bucket)
+        self.current_tick = max(self.current_tick, target)
+        return expired
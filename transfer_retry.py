@@ -0,0 +1,117 @@
+import errno
+import random
+import asyncio
+from pyrogram.errors import FloodWait, RPCError
+from config import Config
+from metrics import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Disk errors: retrying cannot help
+FATAL_ERRNOS = {errno.ENOSPC, errno.EDQUOT, errno.EROFS, errno.EACCES}
+
+
+class TransferStalled(Exception):
+    """Raised when a transfer moved no bytes for STALL_TIMEOUT seconds"""
+
+
+class TransferFailed(ConnectionError):
+    """A pyrogram transfer gave up; pyrogram logs the cause instead of raising it"""
+
+
+def error_class(error):
+    """Retry class of an error, or None when it must not be retried"""
+    if isinstance(error, FloodWait):
+        return 'flood'
+    if isinstance(error, TransferStalled):
+        return 'stall'
+    if isinstance(error, RPCError):
+        # 5xx are Telegram-side hiccups; 4xx mean the request itself is wrong
+        return 'server' if isinstance(error.CODE, int) and error.CODE >= 500 else None
+    if isinstance(error, OSError):
+        return None if error.errno in FATAL_ERRNOS else 'network'
+    if isinstance(error, asyncio.TimeoutError):
+        return 'network'
+    return None
+
+
+def retry_delay(error, attempt):
+    """Seconds to wait before retry number `attempt`, or None to give up"""
+    kind = error_class(error)
+    if kind is None:
+        return None
+    if kind == 'flood':
+        # Telegram says exactly how long; retrying sooner only extends the wait
+        return error.value + 1
+    if kind == 'stall':
+        # The connection is the problem; a fresh one can start right away
+        return 0
+    base, cap = Config.RETRY_BACKOFF[kind]
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def completed(transfer, name="Transfer"):
+    """Await a pyrogram download or send_document, raising when it returned None
+
+    pyrogram swallows network errors, 5xx and FloodWait inside get_file and
+    save_file, so None is the only sign of a failed attempt.
+    """
+    result = await transfer
+    if result is None:
+        raise TransferFailed(f"{name} did not complete")
+    return result
+
+
+async def watch(coro, progress=None):
+    """Await a transfer, aborting it when progress.current stops moving"""
+    task = asyncio.ensure_future(coro)
+    try:
+        if progress is None:
+            return await task
+        loop = asyncio.get_running_loop()
+        last_bytes = progress.current
+        last_change = loop.time()
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=Config.STALL_CHECK_INTERVAL)
+            if done:
+                return task.result()
+            now = loop.time()
+            if progress.current != last_bytes:
+                last_bytes = progress.current
+                last_change = now
+            elif now - last_change >= Config.STALL_TIMEOUT:
+                raise TransferStalled(f"No progress for {Config.STALL_TIMEOUT}s")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def retry_transfer(attempt, progress=None, name="Transfer"):
+    """Run attempt() until it succeeds or fails for good
+
+    Each call of `attempt` must open its own connections and continue from
+    whatever earlier attempts finished. FloodWait is honoured, network and
+    server errors back off per class, and stalled attempts are aborted by
+    the watchdog and retried immediately.
+    """
+    for number in range(1, Config.TRANSFER_MAX_ATTEMPTS + 1):
+        try:
+            result = await watch(attempt(), progress)
+            if progress:
+                progress.details.pop('Retry', None)
+            return result
+        except Exception as e:
+            delay = retry_delay(e, number)
+            if delay is None or number == Config.TRANSFER_MAX_ATTEMPTS:
+                raise
+            kind = error_class(e)
+            metrics.transfer_retries.inc(1, kind)
+            if kind == 'flood':
+                metrics.flood_waits.inc(1, 'transfer')
+            logger.warning(f"{name} attempt {number} failed ({type(e).__name__}: {e}), retrying in {delay:.0f}s")
+            if progress:
+                progress.details['Retry'] = f"#{number} after {type(e).__name__}"
+            await asyncio.sleep(delay)
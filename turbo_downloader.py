@@ -3,25 +3,28 @@ import time
 import asyncio
 from pyrogram.types import Message
 from config import Config
+from parallel_downloader import ParallelDownloader, CdnRedirect, journal_path
+from progress_ticker import TransferProgress
+from staging import StagingArea
+from transfer_retry import retry_transfer, TransferFailed
+from turbo_streamer import STREAM_CHUNK_SIZE
+from metrics import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
 class TurboDownloader:
-    """Turbo-optimized file downloader with duplicate prevention"""
-    
+    """Turbo-optimized file downloader"""
+
     def __init__(self):
-        self.last_update_time = 0
-        self.last_percent = 0
-        self.last_message_text = ""
+        self.parallel = ParallelDownloader()
 
-    async def download_file(self, message: Message, status_message: Message):
-        """Download file with duplicate prevention"""
+    async def download_file(self, message: Message, progress: TransferProgress, area: StagingArea, on_chunk=None):
+        """Download file into the job's staging area, reporting bytes to its progress counters"""
         start_time = time.time()
-        self.last_update_time = 0
-        self.last_percent = 0
-        self.last_message_text = ""
-        
+        file_path = None
+        file_size = 0
+
         try:
             file_obj = message.document or message.video or message.audio
             if not file_obj:
@@ -30,36 +33,29 @@ class TurboDownloader:
             file_name = getattr(file_obj, 'file_name', 'file')
             file_size = getattr(file_obj, 'file_size', 0)
 
-            # Create downloads directory
-            os.makedirs('downloads', exist_ok=True)
-            file_path = os.path.join('downloads', f"temp_{int(time.time())}_{file_name}")
+            file_path = area.path_for(file_name)
 
-            # Initial status message (only once)
-            initial_text = (
-                f"📥 **Downloading File**\n\n"
-                f"**File:** `{file_name}`\n"
-                f"**Size:** {self.format_bytes(file_size)}\n"
-                f"**Status:** Starting download..."
-            )
-            await status_message.edit_text(initial_text)
-            self.last_message_text = initial_text
+            progress.set_phase('DOWNLOADING', file_size, file_name)
+            metrics.in_flight_bytes.inc(file_size)
 
             # Download with progress tracking
-            downloaded_path = await message.download(
-                file_name=file_path,
-                progress=self.progress_callback,
-                progress_args=(status_message, start_time, "DOWNLOADING")
-            )
+            downloaded_path = None
+            if file_size >= Config.PARALLEL_DOWNLOAD_MIN_SIZE:
+                downloaded_path = await self.download_parallel(message, file_obj, file_path, progress, on_chunk)
+
+            if not downloaded_path:
+                downloaded_path = await self.download_stream(message, file_size, file_path, progress, on_chunk)
 
             if downloaded_path and os.path.exists(downloaded_path):
                 download_time = time.time() - start_time
                 actual_size = os.path.getsize(downloaded_path)
                 speed = actual_size / download_time if download_time > 0 else 0
-                
+
                 logger.info(f"Download completed: {file_name} in {download_time:.1f}s")
-                
+                metrics.observe_transfer('download', download_time, actual_size)
+
                 return {
-                    'success': True, 
+                    'success': True,
                     'file_path': downloaded_path,
                     'file_name': file_name,
                     'download_time': download_time,
@@ -68,75 +64,61 @@ class TurboDownloader:
             else:
                 return {'success': False, 'error': 'Download failed'}
 
+        except asyncio.CancelledError:
+            # Don't leave a half-written file behind, unless its journal lets it resume;
+            # a user's /cancel gives up on the file, so the journal goes too
+            if file_path and (progress.cancelled or not os.path.exists(journal_path(file_path))):
+                for path in (file_path, journal_path(file_path)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            raise
         except Exception as e:
             logger.error(f"Download error: {e}")
             return {'success': False, 'error': str(e)}
+        finally:
+            metrics.in_flight_bytes.dec(file_size)
+
+    async def download_parallel(self, message, file_obj, file_path, progress, on_chunk=None):
+        """Multi-connection download, None when the single-stream path must be used
 
-    async def progress_callback(self, current, total, status_message, start_time, action):
-        """Duplicate-protected progress callback"""
-        if total == 0:
-            return
-
-        current_time = time.time()
-        elapsed = current_time - start_time
-        percent = (current / total) * 100
-        
-        # Prevent duplicates: Update only if:
-        # 1. At least 5 seconds passed since last update
-        # 2. AND progress increased by at least 5%
-        # 3. OR it's the first update (0%)
-        # 4. OR download is complete (95%+)
-        time_passed = current_time - self.last_update_time
-        progress_increased = percent - self.last_percent
-        
-        should_update = (
-            (time_passed >= 5 and progress_increased >= 5) or
-            self.last_update_time == 0 or
-            percent >= 95
-        )
-
-        if not should_update:
-            return
-
-        speed = current / elapsed if elapsed > 0 else 0
-        eta = (total - current) / speed if speed > 0 else 0
-
-        # Create simple progress display
-        progress_text = (
-            f"📥 **Downloading File**\n\n"
-            f"**Progress:** {percent:.1f}%\n"
-            f"**Speed:** {self.format_bytes(speed)}/s\n"
-            f"**Time:** {int(elapsed)}s / ~{int(eta)}s\n"
-            f"**Transferred:** {self.format_bytes(current)} / {self.format_bytes(total)}"
-        )
-        
-        # Only update if message content actually changed
-        if progress_text != self.last_message_text:
+        Every retry opens fresh connections and resumes from the journal.
+        """
+        try:
+            return await retry_transfer(lambda: self.parallel.download(
+                message._client, file_obj, os.path.abspath(file_path), progress.on_progress, on_chunk
+            ), progress, "Download")
+        except CdnRedirect:
+            logger.info("CDN redirect, falling back to single-stream download")
+            return None
+
+    async def download_stream(self, message, file_size, file_path, progress, on_chunk=None):
+        """Single-connection download through stream_media, feeding on_chunk like the parallel path
+
+        A retry picks the stream up at the first chunk not yet written.
+        """
+        client = message._client
+        loop = asyncio.get_running_loop()
+        written = 0
+
+        async def attempt():
+            nonlocal written
+            offset = written - written % STREAM_CHUNK_SIZE
+            fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | (0 if offset else os.O_TRUNC), 0o644)
             try:
-                await status_message.edit_text(progress_text)
-                self.last_message_text = progress_text
-                self.last_update_time = current_time
-                self.last_percent = percent
-            except Exception as e:
-                if "FLOOD_WAIT" in str(e):
-                    try:
-                        wait_time = int(str(e).split("FLOOD_WAIT_")[1].split(")")[0])
-                        logger.info(f"Flood wait: {wait_time}s, skipping update")
-                        await asyncio.sleep(wait_time)
-                    except:
-                        pass
-                # Skip update for other errors
-
-    def format_bytes(self, size):
-        """Format bytes to human readable"""
-        if not size or size <= 0:
-            return "0 B"
-        
-        units = ['B', 'KB', 'MB', 'GB']
-        unit_index = 0
-        
-        while size >= 1024 and unit_index < len(units) - 1:
-            size /= 1024.0
-            unit_index += 1
-            
-        return f"{size:.1f} {units[unit_index]}"
+                async for chunk in client.stream_media(message, offset=offset // STREAM_CHUNK_SIZE):
+                    await loop.run_in_executor(None, os.pwrite, fd, chunk, offset)
+                    if on_chunk:
+                        on_chunk(offset, chunk)
+                    offset += len(chunk)
+                    written = max(written, offset)
+                    await progress.on_progress(offset, file_size)
+            finally:
+                os.close(fd)
+            if offset < file_size:
+                # pyrogram ends the generator quietly when a request fails
+                raise TransferFailed(f"Stream ended at {offset}/{file_size} bytes")
+            return file_path
+
+        return await retry_transfer(attempt, progress, "Download")
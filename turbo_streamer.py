@@ -0,0 +1,115 @@
+import time
+import asyncio
+from pyrogram.types import Message
+from config import Config
+from part_uploader import PartUploader, target_file_name
+from progress_ticker import TransferProgress
+from metrics import metrics
+from transfer_retry import retry_transfer, TransferFailed
+import logging
+
+logger = logging.getLogger(__name__)
+
+# pyrogram's stream_media yields, and takes offsets in, 1MB chunks
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class TurboStreamer:
+    """Disk-free rename: pipes download chunks straight into the upload"""
+
+    async def stream_file(self, client, message: Message, new_filename, progress: TransferProgress,
+                          chat_id, caption, thumb=None, on_chunk=None):
+        """Download and re-upload a file through a bounded in-memory buffer
+
+        `thumb` may be a callable, resolved at commit time so thumbnails
+        produced while streaming can still be attached.
+        """
+        start_time = time.time()
+
+        file_obj = message.document or message.video or message.audio
+        if not file_obj:
+            return {'success': False, 'error': 'No file found'}
+
+        original_name = getattr(file_obj, 'file_name', None) or 'file'
+        file_size = getattr(file_obj, 'file_size', 0)
+        if not file_size:
+            return {'success': False, 'error': 'Unknown file size'}
+
+        file_name = target_file_name(original_name, new_filename)
+        uploader = PartUploader(client, file_name, file_size)
+        part_size = uploader.part_size
+
+        progress.set_phase('STREAMING', file_size, file_name)
+
+        async def produce(parts, first_chunk):
+            """Split downloaded chunks into upload-sized parts"""
+            buffer = bytearray()
+            offset = first_chunk * STREAM_CHUNK_SIZE
+            index = offset // part_size
+            async for chunk in client.stream_media(message, offset=first_chunk):
+                if on_chunk:
+                    on_chunk(offset, chunk)
+                offset += len(chunk)
+                buffer.extend(chunk)
+                while len(buffer) >= part_size:
+                    await parts.put((index, bytes(buffer[:part_size])))
+                    del buffer[:part_size]
+                    index += 1
+            if offset < file_size:
+                # pyrogram ends the generator quietly when a request fails
+                raise TransferFailed(f"Stream ended at {offset}/{file_size} bytes")
+            if buffer and offset == file_size:
+                # Only the file's last part may be short; a stream cut off early
+                # must not leave a truncated part among the saved ones
+                await parts.put((index, bytes(buffer)))
+                index += 1
+            await parts.put(None)
+            return index
+
+        async def attempt():
+            # Fresh connections each time, restarting the stream at the first part Telegram lacks
+            first_part = min(set(range(uploader.total_parts)) - uploader.saved, default=uploader.total_parts)
+            parts = asyncio.Queue(maxsize=Config.STREAM_BUFFER_PARTS)
+            tasks = []
+            try:
+                await uploader.start()
+                producer = asyncio.ensure_future(produce(parts, first_part * part_size // STREAM_CHUNK_SIZE))
+                consumer = asyncio.ensure_future(uploader.upload_parts(parts, progress.on_progress))
+                tasks = [producer, consumer]
+                return await asyncio.gather(producer, consumer)
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await uploader.stop()
+
+        metrics.in_flight_bytes.inc(file_size)
+
+        try:
+            produced_parts, uploaded = await retry_transfer(attempt, progress, "Stream")
+
+            if produced_parts != uploader.total_parts:
+                return {'success': False, 'error': 'Stream size mismatch'}
+
+            sent_message = await uploader.commit(chat_id, caption, thumb() if callable(thumb) else thumb)
+
+            transfer_time = time.time() - start_time
+            speed = uploaded / transfer_time if transfer_time > 0 else 0
+            logger.info(f"Stream completed: {file_name} in {transfer_time:.1f}s")
+            metrics.observe_transfer('stream', transfer_time, uploaded)
+
+            return {
+                'success': True,
+                'upload_time': transfer_time,
+                'speed': speed,
+                'message': sent_message,
+                'file_name': file_name,
+                'file_size': uploaded
+            }
+
+        except Exception as e:
+            logger.error(f"Stream error: {e}")
+            return {'success': False, 'error': str(e)}
+        finally:
+            metrics.in_flight_bytes.dec(file_size)
@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UploadIndex:
+    """Persistent map of (source file, target name, thumbnail) to an uploaded file_id"""
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or Config.UPLOAD_INDEX_PATH
+        self.max_entries = max_entries or Config.UPLOAD_INDEX_MAX_ENTRIES
+        self.entries = OrderedDict()  # key -> {'file_id', 'created'}, least recently used first
+        self.loaded = False
+        self.dirty = False
+        self.flusher = None
+        self.write_lock = threading.Lock()  # a cancelled flush may still be writing
+
+    def load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            self.entries = OrderedDict()
+
+    @staticmethod
+    def key(unique_id, file_name, thumb_key):
+        return f"{unique_id}|{file_name}|{thumb_key or '-'}"
+
+    def get(self, unique_id, file_name, thumb_key):
+        """Previously uploaded file_id for this exact request, if any"""
+        self.load()
+        key = self.key(unique_id, file_name, thumb_key)
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        self.entries.move_to_end(key)
+        return entry['file_id']
+
+    def put(self, unique_id, file_name, thumb_key, file_id):
+        self.load()
+        key = self.key(unique_id, file_name, thumb_key)
+        self.entries[key] = {'file_id': file_id, 'created': time.time()}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.mark_dirty()
+
+    def discard(self, unique_id, file_name, thumb_key):
+        """Forget an entry Telegram no longer accepts"""
+        self.load()
+        if self.entries.pop(self.key(unique_id, file_name, thumb_key), None):
+            self.mark_dirty()
+
+    def mark_dirty(self):
+        """Schedule a write; changes within UPLOAD_INDEX_FLUSH_DELAY share one"""
+        self.dirty = True
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.ensure_future(self.run_flusher())
+
+    async def run_flusher(self):
+        while self.dirty:
+            await asyncio.sleep(Config.UPLOAD_INDEX_FLUSH_DELAY)
+            await self.flush()
+
+    async def flush(self):
+        """Write the index from a worker thread, off the event loop"""
+        if not self.dirty:
+            return
+        self.dirty = False
+        # Entries are replaced, never mutated, so a shallow snapshot is enough
+        items = list(self.entries.items())
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.save, items)
+
+    async def stop(self):
+        """Write pending changes before shutdown"""
+        if self.flusher:
+            self.flusher.cancel()
+            await asyncio.gather(self.flusher, return_exceptions=True)
+            self.flusher = None
+        await self.flush()
+
+    def save(self, items):
+        """Atomically persist the index; runs in an executor thread"""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with self.write_lock:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(OrderedDict(items), f)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Upload index save failed: {e}")
+
+
+# Process-wide uploaded file index
+upload_index = UploadIndex()
@@ -0,0 +1,114 @@
+import time
+from datetime import date
+from pyrogram.types import Message
+from rate_limiter import SlidingWindow
+
+
+class MessageRef:
+    """A file message kept as ids only, re-fetched when it is needed"""
+
+    __slots__ = ('chat_id', 'id')
+
+    def __init__(self, chat_id, message_id):
+        self.chat_id = chat_id
+        self.id = message_id
+
+    async def fetch(self, client):
+        return await client.get_messages(self.chat_id, self.id)
+
+
+class BatchRecord:
+    """Files collected by /batch or an album"""
+
+    __slots__ = ('chat_id', 'message_ids', 'explicit', 'album_id')
+
+    def __init__(self, chat_id, explicit, album_id=None, message_ids=None):
+        self.chat_id = chat_id
+        self.message_ids = message_ids or []
+        self.explicit = explicit
+        self.album_id = album_id
+
+    async def fetch(self, client):
+        """Live file messages in the order they were sent; deleted ones are dropped"""
+        if not self.message_ids:
+            return []
+        messages = await client.get_messages(self.chat_id, sorted(self.message_ids))
+        return [m for m in messages if m and not m.empty]
+
+
+class UserSession:
+    """Compact per-user state: a pending file, a batch and rate-limit counters"""
+
+    __slots__ = (
+        'user_id', 'file_chat_id', 'file_message_id', 'file_unique_id', 'file_size', 'received_at',
+        'waiting_for_name', 'batch', 'files_today', 'day', 'file_window', 'byte_window',
+    )
+    WINDOWS = ('file_window', 'byte_window')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.file_chat_id = None
+        self.file_message_id = None
+        self.file_unique_id = None
+        self.file_size = 0
+        self.received_at = 0.0
+        self.waiting_for_name = False
+        self.batch = None
+        self.files_today = 0
+        self.day = 0  # date ordinal the daily counter belongs to
+        self.file_window = SlidingWindow()  # files admitted, for the rate limiter
+        self.byte_window = SlidingWindow()  # bytes transferred, for the rate limiter
+
+    def set_pending(self, message: Message, file_size):
+        """Remember a file waiting for its new name"""
+        file_obj = message.document or message.video or message.audio
+        self.file_chat_id = message.chat.id
+        self.file_message_id = message.id
+        self.file_unique_id = getattr(file_obj, 'file_unique_id', None)
+        self.file_size = file_size
+        self.received_at = time.time()
+        self.waiting_for_name = True
+
+    def take_pending(self):
+        """Reference to the pending file, which now belongs to a job"""
+        if not self.waiting_for_name or self.file_message_id is None:
+            return None
+        ref = MessageRef(self.file_chat_id, self.file_message_id)
+        self.clear_pending()
+        return ref
+
+    def clear_pending(self):
+        self.file_chat_id = None
+        self.file_message_id = None
+        self.file_unique_id = None
+        self.file_size = 0
+        self.waiting_for_name = False
+
+    def count_file(self):
+        """Count a completed file towards today's stats"""
+        today = date.today().toordinal()
+        if self.day != today:
+            self.day = today
+            self.files_today = 0
+        self.files_today += 1
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__ if name not in ('batch',) + self.WINDOWS}
+        for name in self.WINDOWS:
+            data[name] = getattr(self, name).to_list()
+        if self.batch:
+            data['batch'] = {name: getattr(self.batch, name) for name in BatchRecord.__slots__}
+        return data
+
+    @classmethod
+    def from_dict(cls, user_id, data):
+        session = cls(user_id)
+        for name in cls.__slots__:
+            if name in data and name not in ('user_id', 'batch') + cls.WINDOWS:
+                setattr(session, name, data[name])
+        for name in cls.WINDOWS:
+            setattr(session, name, SlidingWindow.from_list(data.get(name)))
+        if data.get('batch'):
+            batch = data['batch']
+            session.batch = BatchRecord(batch['chat_id'], batch['explicit'], batch['album_id'], batch['message_ids'])
+        return session
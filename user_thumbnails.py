@@ -0,0 +1,113 @@
+import io
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+from config import Config
+from PIL import Image
+from thumbnail_registry import ThumbnailEntry, encode_thumbnail, thumbnail_pool
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UserThumbnailStore:
+    """Per-user thumbnails: memory-bounded LRU of encoded bytes over a small on-disk store"""
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or Config.USER_THUMB_DIR
+        self.max_bytes = max_bytes or Config.USER_THUMB_CACHE_BYTES
+        self.cache = OrderedDict()  # user_id -> ThumbnailEntry, least recently used first
+        self.cache_bytes = 0
+        self.missing = OrderedDict()  # users recently seen without a thumbnail, oldest first
+
+    def path(self, user_id):
+        return os.path.join(self.root, f"{user_id}.jpg")
+
+    async def set(self, user_id, raw):
+        """Resize and encode a photo once, off the event loop, then store it"""
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(thumbnail_pool, process_user_thumbnail, raw)
+        await loop.run_in_executor(thumbnail_pool, self.write, user_id, data)
+
+        entry = make_entry(data, f"user:{user_id}")
+        self.missing.pop(user_id, None)
+        self.remember(user_id, entry)
+        return entry
+
+    async def get(self, user_id):
+        """Encoded thumbnail for a user, or None"""
+        entry = self.cache.get(user_id)
+        if entry:
+            self.cache.move_to_end(user_id)
+            return entry
+        if user_id in self.missing:
+            self.missing.move_to_end(user_id)
+            return None
+
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(thumbnail_pool, self.read, user_id)
+        if data is None:
+            self.mark_missing(user_id)
+            return None
+
+        entry = make_entry(data, f"user:{user_id}")
+        self.remember(user_id, entry)
+        return entry
+
+    def delete(self, user_id):
+        """Remove a user's thumbnail; returns whether one existed"""
+        entry = self.cache.pop(user_id, None)
+        if entry:
+            self.cache_bytes -= entry.size
+        self.mark_missing(user_id)
+        try:
+            os.remove(self.path(user_id))
+            return True
+        except OSError:
+            return entry is not None
+
+    def mark_missing(self, user_id):
+        """Skip the disk check for this user next time; forgotten users are simply checked again"""
+        self.missing[user_id] = True
+        self.missing.move_to_end(user_id)
+        while len(self.missing) > Config.USER_THUMB_MISSING_SIZE:
+            self.missing.popitem(last=False)
+
+    def remember(self, user_id, entry):
+        old = self.cache.pop(user_id, None)
+        if old:
+            self.cache_bytes -= old.size
+        self.cache[user_id] = entry
+        self.cache_bytes += entry.size
+        while self.cache_bytes > self.max_bytes and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted.size
+
+    def write(self, user_id, data):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.path(user_id)}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(user_id))
+
+    def read(self, user_id):
+        try:
+            with open(self.path(user_id), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+def process_user_thumbnail(raw):
+    """Decode, resize and encode an uploaded photo"""
+    with Image.open(io.BytesIO(raw)) as img:
+        return encode_thumbnail(img)
+
+
+def make_entry(data, source):
+    return ThumbnailEntry(hashlib.sha256(data).hexdigest()[:16], data, source)
+
+
+# Process-wide per-user thumbnail store
+user_thumbnails = UserThumbnailStore()
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import ffmpeg
+from config import Config
+from thumbnail_registry import ThumbnailEntry
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def extract_frame(head):
+    """Grab a representative frame from the start of a video as a JPEG (runs in a worker process)"""
+    width, height = Config.THUMBNAIL_SIZE
+    process = (
+        ffmpeg
+        .input('pipe:0')
+        .output(
+            'pipe:1',
+            vf=f"thumbnail,scale={width}:{height}:force_original_aspect_ratio=decrease",
+            vframes=1,
+            format='image2',
+            vcodec='mjpeg',
+            **{'q:v': 5}
+        )
+        .global_args('-loglevel', 'error')
+        .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
+    )
+    try:
+        frame, _ = process.communicate(input=head, timeout=Config.FFMPEG_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        return None
+    return frame or None
+
+
+def read_head(path, size):
+    with open(path, 'rb') as f:
+        return f.read(size)
+
+
+class HeadCapture:
+    """Collects the first bytes of a transfer and starts frame extraction once they exist"""
+
+    def __init__(self, thumbnailer, unique_id, file_size):
+        self.thumbnailer = thumbnailer
+        self.unique_id = unique_id
+        self.limit = min(Config.VIDEO_THUMB_HEAD_BYTES, file_size)
+        self.chunks = {}  # offset -> bytes, for chunks arriving out of order
+        self.head = bytearray()
+        self.task = None
+
+    def feed(self, offset, data):
+        """Offer a downloaded chunk; cheap no-op once the head is complete"""
+        if self.task or offset >= self.limit:
+            return
+        self.chunks[offset] = data
+        while len(self.head) in self.chunks:
+            self.head.extend(self.chunks.pop(len(self.head)))
+        if len(self.head) >= self.limit:
+            self.chunks.clear()
+            self.task = asyncio.ensure_future(self.thumbnailer.extract(self.unique_id, bytes(self.head[:self.limit])))
+            self.head = bytearray()
+
+    async def feed_file(self, path):
+        """Start extraction from a file already on disk, reading its head in a thread"""
+        if self.task:
+            return
+        try:
+            head = await asyncio.to_thread(read_head, path, self.limit)
+        except OSError as e:
+            logger.warning(f"Could not read video head: {e}")
+            return
+        self.feed(0, head)
+
+    def result(self):
+        """Extracted thumbnail if it is ready, without ever waiting for it"""
+        if self.task and self.task.done() and not self.task.cancelled() and not self.task.exception():
+            return self.task.result()
+        return None
+
+    async def wait(self, timeout):
+        """Extracted thumbnail, giving a running extraction up to `timeout` seconds"""
+        if self.task and not self.task.done():
+            await asyncio.wait({self.task}, timeout=timeout)
+        return self.result()
+
+    def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+
+class VideoThumbnailer:
+    """Frame thumbnails for video documents, cached by file_unique_id"""
+
+    def __init__(self):
+        self.cache = OrderedDict()  # unique_id -> ThumbnailEntry, least recently used first
+        self.pool = None
+
+    def cached(self, unique_id):
+        entry = self.cache.get(unique_id)
+        if entry:
+            self.cache.move_to_end(unique_id)
+        return entry
+
+    def capture(self, unique_id, file_size):
+        """Head capture for a new transfer"""
+        return HeadCapture(self, unique_id, file_size)
+
+    async def extract(self, unique_id, head):
+        """Extract a frame in the process pool and cache it"""
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=Config.FFMPEG_WORKERS)
+
+        loop = asyncio.get_running_loop()
+        try:
+            frame = await loop.run_in_executor(self.pool, extract_frame, head)
+        except Exception as e:
+            logger.warning(f"Frame extraction failed: {e}")
+            return None
+        if not frame:
+            return None
+
+        entry = ThumbnailEntry(hashlib.sha256(frame).hexdigest()[:16], frame, "video frame")
+        self.cache[unique_id] = entry
+        while len(self.cache) > Config.VIDEO_THUMB_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return entry
+
+
+def is_video(file_info):
+    return bool(file_info) and str(file_info.get('mime_type') or '').startswith('video/')
+
+
+# Process-wide video thumbnailer
+video_thumbnailer = VideoThumbnailer()
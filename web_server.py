@@ -1,145 +1,113 @@
-from flask import Flask, request, jsonify
-import threading
+from aiohttp import web
 import time
 import logging
 from typing import Optional
 from config import Config
+from metrics import metrics
+from job_api import job_api
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class WebServer:
-    def __init__(self, host: str = '0.0.0.0', port: int = 5000):
-        self.host = host
-        self.port = port
-        self.app = Flask(__name__)
-        self.server_thread: Optional[threading.Thread] = None
+    """HTTP endpoints served from the bot's own event loop"""
+
+    def __init__(self, host: str = None, port: int = None):
+        self.host = host or Config.WEB_HOST
+        self.port = port or Config.WEB_PORT
+        self.app = web.Application()
+        self.runner: Optional[web.AppRunner] = None
         self.is_running = False
-        
+
         # Setup routes
         self.setup_routes()
-    
+
     def setup_routes(self):
         """Define all web routes for the server."""
-        
-        @self.app.route('/')
-        def home():
-            """Health check endpoint."""
-            return jsonify({
-                'status': 'online',
-                'service': 'file_renamer_bot',
-                'timestamp': time.time()
-            })
-        
-        @self.app.route('/health')
-        def health_check():
-            """Health check endpoint."""
-            return jsonify({
-                'status': 'healthy',
-                'timestamp': time.time()
-            })
-        
-        @self.app.route('/stats', methods=['GET'])
-        def get_stats():
-            """Get bot statistics (placeholder - implement as needed)."""
-            return jsonify({
-                'status': 'running',
-                'uptime': 'N/A',  # You can implement uptime tracking
-                'users_served': 0,  # Implement your own metrics
-                'files_processed': 0,
-                'timestamp': time.time()
-            })
-        
-        @self.app.route('/webhook', methods=['POST'])
-        def webhook_handler():
-            """Webhook endpoint for external services."""
-            try:
-                data = request.get_json()
-                logger.info(f"Received webhook data: {data}")
-                
-                # Process webhook data here
-                # You can add your webhook processing logic
-                
-                return jsonify({'status': 'webhook received'}), 200
-            except Exception as e:
-                logger.error(f"Webhook error: {e}")
-                return jsonify({'error': 'Invalid webhook data'}), 400
-        
-        @self.app.route('/restart', methods=['POST'])
-        def restart_bot():
-            """Endpoint to gracefully restart the bot (admin only)."""
-            # Add authentication here if needed
-            auth_token = request.headers.get('Authorization')
-            
-            # Simple token check - enhance for production
-            if auth_token != 'your-secret-token':  # Change this!
-                return jsonify({'error': 'Unauthorized'}), 401
-            
-            # Implement restart logic here
-            logger.info("Restart endpoint called")
-            return jsonify({'status': 'restart initiated'}), 200
-    
-    def start(self, daemon: bool = True):
-        """Start the web server in a separate thread."""
-        def run_server():
-            try:
-                logger.info(f"Starting web server on {self.host}:{self.port}")
-                self.is_running = True
-                self.app.run(
-                    host=self.host,
-                    port=self.port,
-                    debug=False,
-                    use_reloader=False,
-                    threaded=True
-                )
-            except Exception as e:
-                logger.error(f"Web server error: {e}")
-                self.is_running = False
-        
-        self.server_thread = threading.Thread(target=run_server, daemon=daemon)
-        self.server_thread.start()
-        
-        # Wait a moment for server to start
-        time.sleep(1)
-        return self.is_running
-    
-    def stop(self):
-        """Stop the web server."""
-        # Flask development server doesn't have a clean shutdown
-        # In production, consider using Waitress or Gunicorn instead
-        logger.info("Stopping web server")
+        self.app.router.add_get('/', self.home)
+        self.app.router.add_get('/health', self.health_check)
+        self.app.router.add_get('/stats', self.get_stats)
+        self.app.router.add_get('/metrics', self.get_metrics)
+        self.app.router.add_post('/restart', self.restart_bot)
+        # POST /jobs (and the old /webhook), GET /jobs/{id}, GET /jobs/{id}/events
+        job_api.setup(self.app)
+
+    async def home(self, request):
+        """Health check endpoint."""
+        return web.json_response({
+            'status': 'online',
+            'service': 'file_renamer_bot',
+            'timestamp': time.time()
+        })
+
+    async def health_check(self, request):
+        """Health check endpoint."""
+        return web.json_response({
+            'status': 'healthy',
+            'timestamp': time.time()
+        })
+
+    async def get_stats(self, request):
+        """Get bot statistics."""
+        return web.json_response({
+            'status': 'running',
+            **metrics.snapshot(),
+            'timestamp': time.time()
+        })
+
+    async def get_metrics(self, request):
+        """Prometheus metrics."""
+        return web.Response(
+            text=metrics.render(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    async def restart_bot(self, request):
+        """Endpoint to gracefully restart the bot (admin only)."""
+        # Add authentication here if needed
+        auth_token = request.headers.get('Authorization')
+
+        # Simple token check - enhance for production
+        if auth_token != 'your-secret-token':  # Change this!
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+
+        # Implement restart logic here
+        logger.info("Restart endpoint called")
+        return web.json_response({'status': 'restart initiated'})
+
+    async def start(self):
+        """Start serving; returns once the port is bound"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.is_running = True
+        logger.info(f"Web server listening on {self.host}:{self.port}")
+        return True
+
+    async def stop(self):
+        """Close the listener and finish in-flight requests"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
         self.is_running = False
-        # Note: This won't stop the Flask dev server gracefully
-        # For production, you'd need a proper WSGI server
+        logger.info("Web server stopped")
 
 # Singleton instance
 web_server = WebServer()
 
-def start_web_server():
+async def start_web_server():
     """Convenience function to start the web server."""
-    return web_server.start()
+    return await web_server.start()
 
-def stop_web_server():
+async def stop_web_server():
     """Convenience function to stop the web server."""
-    web_server.stop()
+    await web_server.stop()
 
 # For standalone execution
 if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
     logger.info("Starting web server in standalone mode...")
-    server = WebServer()
-    
-    try:
-        # Run in main thread (blocking)
-        server.app.run(
-            host=server.host,
-            port=server.port,
-            debug=True
-        )
-    except KeyboardInterrupt:
-        logger.info("Web server stopped by user")
-    except Exception as e:
-        logger.error(f"Failed to start web server: {e}")
+    web.run_app(web_server.app, host=web_server.host, port=web_server.port)